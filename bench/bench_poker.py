@@ -0,0 +1,211 @@
+""" card / poker モジュールの主な処理の速度を測るベンチマーク
+
+    固定の seedで作った手札の集まり(コーパス)に対して処理を繰り返し、
+    1秒あたりの処理回数を JSONで書き出す
+    以前の結果を --compareで渡すと比較し、遅くなっていたら終了コード 1で終わる
+
+    実行例:
+        PYTHONPATH=./src python bench/bench_poker.py -o bench.json
+        PYTHONPATH=./src python bench/bench_poker.py --compare bench.json
+
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import timeit
+from typing import Callable
+
+from card import Deck
+from poker import PokerCard, PokerHand, score_table, showdown
+
+
+def make_corpus(size: int, seed: int) -> list[list[PokerCard]]:
+    """seedから 5枚の手札の集まりを作る
+    """
+    rng = random.Random(seed)
+    deck = Deck(card_cls=PokerCard, joker=False, rng=rng)
+    corpus = []
+    for _ in range(size):
+        deck.reset()
+        deck.shuffle(5)
+        corpus.append(deck.draw_many(5))
+    return corpus
+
+
+def make_hands(corpus: list[list[PokerCard]]) -> list[PokerHand]:
+    hands = []
+    for cards in corpus:
+        hand = PokerHand()
+        for card in cards:
+            hand.append(card)
+        hands.append(hand)
+    return hands
+
+
+def cases(corpus: list[list[PokerCard]], seed: int) \
+        -> dict[str, Callable[[], None]]:
+    """測定する処理(1回の呼び出しでコーパスの手札数だけ処理する)
+    """
+    n = len(corpus)
+    rng = random.Random(seed)
+    deck = Deck(card_cls=PokerCard, joker=False, rng=rng)
+    hands = make_hands(corpus)
+    pairs = list(zip(hands, hands[1:] + hands[:1]))
+    tables = [hands[i:i + 5] for i in range(0, n - 4, 5)]
+
+    def deck_construct():
+        for _ in range(n):
+            Deck(card_cls=PokerCard, joker=False)
+
+    def deck_shuffle():
+        for _ in range(n):
+            deck.reset()
+            deck.shuffle()
+
+    def deck_draw():
+        for _ in range(n // 50):
+            deck.reset()
+            for _ in range(50):
+                deck.draw()
+
+    def hand_append():
+        for cards in corpus:
+            hand = PokerHand()
+            for card in cards:
+                hand.append(card)
+
+    def build_evaluate():
+        # 手札を作ってから評価するまで(配ってすぐ評価する通常の使い方)
+        PokerHand.score_cache.clear()
+        for cards in corpus:
+            hand = PokerHand()
+            for card in cards:
+                hand.append(card)
+            hand.evaluate()
+
+    def hand_sort():
+        for hand in hands:
+            hand.sort()
+
+    def evaluate():
+        # キャッシュを使わずに評価する
+        for hand in hands:
+            hand._changed()
+            hand.evaluate()
+
+    def evaluate_cached():
+        for hand in hands:
+            hand.evaluate()
+
+    def compare():
+        for a, b in pairs:
+            a._changed()
+            b._changed()
+            a > b
+
+    def showdown_5():
+        for table in tables:
+            for hand in table:
+                hand._changed()
+            showdown(table)
+
+    return {
+        "deck_construct": deck_construct,
+        "deck_shuffle": deck_shuffle,
+        "deck_draw": deck_draw,
+        "hand_append": hand_append,
+        "build_evaluate": build_evaluate,
+        "hand_sort": hand_sort,
+        "evaluate": evaluate,
+        "evaluate_cached": evaluate_cached,
+        "compare": compare,
+        "showdown_5": showdown_5,
+    }
+
+
+def run(size: int = 2000, seed: int = 20240101, repeat: int = 5,
+        only: list[str] | None = None) -> dict:
+    """すべての処理を測定して結果を辞書で返す
+
+    処理ごとに repeat回測り、最も速かった回から 1秒あたりの処理回数を求める
+    """
+    score_table()
+    corpus = make_corpus(size, seed)
+    results = {}
+    for name, func in cases(corpus, seed).items():
+        if only and name not in only:
+            continue
+        func()
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        results[name] = {"seconds": best, "ops": size,
+                         "ops_per_sec": size / best}
+    return {"meta": meta(size, seed, repeat), "results": results}
+
+
+def meta(size: int, seed: int, repeat: int) -> dict:
+    """測定条件(比較するときに条件が同じか確認するため)
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(),
+            "machine": platform.machine(), "size": size, "seed": seed,
+            "repeat": repeat}
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    """以前の結果と比べて、threshold以上遅くなった処理の名前を返す
+    """
+    regressions = []
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            print(f"{name:16s} {result['ops_per_sec']:14,.0f}/s  (new)")
+            continue
+        ratio = result["ops_per_sec"] / before["ops_per_sec"]
+        mark = ""
+        if ratio < 1 - threshold:
+            regressions.append(name)
+            mark = "  REGRESSION"
+        print(f"{name:16s} {result['ops_per_sec']:14,.0f}/s  "
+              f"{ratio:6.2f}x{mark}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="結果を書き出す JSONファイル")
+    parser.add_argument("--compare", help="比較する以前の結果の JSONファイル")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="遅くなったとみなす割合(デフォルト 0.10)")
+    parser.add_argument("--size", type=int, default=2000,
+                        help="コーパスの手札の数")
+    parser.add_argument("--seed", type=int, default=20240101)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="測定する処理の名前")
+    args = parser.parse_args(argv)
+
+    result = run(args.size, args.seed, args.repeat, args.only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if (old["meta"]["size"], old["meta"]["seed"]) != (args.size,
+                                                          args.seed):
+            print("warning: the corpus differs from the compared result")
+        return 1 if compare(old, result, args.threshold) else 0
+    for name, r in result["results"].items():
+        print(f"{name:16s} {r['ops_per_sec']:14,.0f}/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
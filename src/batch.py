@@ -0,0 +1,270 @@
+""" NumPyを使ってポーカーの手札をまとめて評価するモジュール
+
+    カードは Card.idと同じ通し番号((スート - 1) * 13 + 番号 - 1)で表す
+    ジョーカーには対応しない
+
+    * evaluate_batch: (N, 5)の通し番号の配列から役と同じ役の中の強さを求める
+    * score_batch: (N, 5)の通し番号の配列から評価値を求める
+    * encode_hands: 手札のリストを (N, 5)の通し番号の配列にする
+    * shuffle_decks: 多数のデッキをまとめてシャッフルする
+    * deal_hands: 多数のデッキをシャッフルして手札を配る
+    * spawn_generators: 1つの seedから独立した乱数生成器を複数作る
+    * class HandBatch: 多数の 5枚の手札を列ごとの配列で持つ入れ物
+
+"""
+from typing import Iterable
+
+import numpy as np
+
+from card import Hand
+from poker import (HAND_NAMES, PokerCard, PokerHand, PokerHandEnum,
+                   SCORE_UNIT, WHEEL_MINOR)
+
+# 強さ(2..14)から 2を引いた値を rank(0..12)として扱う
+_RANKS = np.arange(13)
+_STRENGTHS = _RANKS + 2
+_WHEEL_RANKS = [0, 1, 2, 3, 12]
+
+
+def encode_hands(hands: Iterable[Hand]) -> np.ndarray:
+    """手札のリストを (N, 5)の通し番号の配列にする
+    """
+    return np.array([[c.id for c in hand.cards] for hand in hands],
+                    dtype=np.int64).reshape(-1, 5)
+
+
+def evaluate_batch(ids) -> tuple[np.ndarray, np.ndarray]:
+    """手札をまとめて評価する
+
+    結果は PokerHand.evaluate後の major, minorと一致する
+
+    Args:
+        ids: 5枚の手札の通し番号を並べた (N, 5)の整数配列
+
+    Returns:
+        (役(PokerHandEnumの値)の配列, 同じ役の中の強さの配列)
+
+    Raises:
+        ValueError: 配列の形が (N, 5)でない、または通し番号が範囲外
+
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if ids.ndim != 2 or ids.shape[1] != 5:
+        raise ValueError(f"expected an (N, 5) array, got {ids.shape}")
+    if ids.size and (ids.min() < 0 or ids.max() > 51):
+        raise ValueError("card ids must be in range(52)")
+
+    suits = ids // 13
+    numbers = ids % 13
+    # Aを最強にした rank(2 → 0, ..., K → 11, A → 12)
+    ranks = np.where(numbers == 0, 12, numbers - 1)
+
+    # 番号ごとの枚数(N, 13)
+    counts = (ranks[:, :, None] == _RANKS).sum(axis=1)
+    present = counts > 0
+    ordered = -np.sort(-counts, axis=1)
+    first, second = ordered[:, 0], ordered[:, 1]
+
+    flush = (suits == suits[:, :1]).all(axis=1)
+    low = ranks.min(axis=1)
+    distinct = present.sum(axis=1) == 5
+    # A-2-3-4-5(ホイール)は rank 0, 1, 2, 3, 12
+    wheel = present[:, _WHEEL_RANKS].all(axis=1)
+    straight = distinct & ((ranks.max(axis=1) - low == 4) | wheel)
+
+    # 優先度の低い役から順に上書きする
+    major = np.full(len(ids), PokerHandEnum.NO_PAIR, dtype=np.int64)
+    for cond, hand in (
+            ((first == 2) & (second == 1), PokerHandEnum.ONE_PAIR),
+            ((first == 2) & (second == 2), PokerHandEnum.TWO_PAIR),
+            ((first == 3) & (second == 1), PokerHandEnum.THREE_OF_A_KIND),
+            (straight, PokerHandEnum.STRAIGHT),
+            (flush, PokerHandEnum.FLUSH),
+            ((first == 3) & (second == 2), PokerHandEnum.FULL_HOUSE),
+            (first == 4, PokerHandEnum.FOUR_OF_A_KIND),
+            (straight & flush, PokerHandEnum.STRAIGHT_FLUSH),
+            (straight & flush & (low == 8),
+             PokerHandEnum.ROYAL_STRAIGHT_FLUSH)):
+        major[cond] = hand
+
+    # (枚数, 強さ)の降順に強さを 100進数で並べる(PokerHand.__calc_minorと同じ)
+    keys = np.where(present, counts * 16 + _STRENGTHS, 0)
+    keys = -np.sort(-keys, axis=1)[:, :5]
+    minor = np.zeros(len(ids), dtype=np.int64)
+    for j in range(5):
+        minor = np.where(keys[:, j] > 0, minor * 100 + keys[:, j] % 16, minor)
+    # ホイールは Aを 1として扱う
+    minor[wheel] = WHEEL_MINOR
+
+    return major, minor
+
+
+def score_batch(ids) -> np.ndarray:
+    """手札をまとめて評価し、評価値(役 * SCORE_UNIT + 同じ役の中の強さ)を返す
+    """
+    major, minor = evaluate_batch(ids)
+    return major * SCORE_UNIT + minor
+
+
+def shuffle_decks(n: int, rng: np.random.Generator | int | None = None,
+                  size: int = 52) -> np.ndarray:
+    """n個のデッキをまとめてシャッフルする
+
+    Args:
+        n: デッキの数
+        rng: 乱数生成器または seed(Noneなら毎回異なる)
+        size: 1デッキの枚数(通し番号 0 ~ size - 1を並べ替える)
+
+    Returns:
+        1行が 1デッキ分の通し番号の並びになっている (n, size)の配列
+    """
+    rng = np.random.default_rng(rng)
+    decks = np.broadcast_to(np.arange(size, dtype=np.uint8), (n, size))
+    return rng.permuted(decks, axis=1)
+
+
+def deal_hands(n: int, players: int,
+               rng: np.random.Generator | int | None = None) -> np.ndarray:
+    """n個のデッキをシャッフルして、それぞれ players人に 5枚ずつ配る
+
+    Returns:
+        (n, players, 5)の通し番号の配列
+    """
+    if players * 5 > 52:
+        raise ValueError("not enough cards for all players")
+    decks = shuffle_decks(n, rng)
+    return decks[:, :players * 5].reshape(n, players, 5)
+
+
+def spawn_generators(seed: int | None, n: int) -> list[np.random.Generator]:
+    """1つの seedから独立した NumPyの乱数生成器を n個作る
+    """
+    return [np.random.default_rng(s)
+            for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+class HandBatch:
+    """多数の 5枚の手札を列ごとの配列で持つ入れ物
+
+    手札ごとに PokerHandを作らず、カードの通し番号を (N, 5)の uint8の配列で持つ
+    評価値・役の列は最初に参照したときにまとめて求める
+    基本的なスライスはコピーせずに元の配列を参照する(評価済みの列も共有する)
+    並べ替えや絞り込みは新しい配列を作るが、手札ごとのオブジェクトは作らない
+    PokerHandが必要なときは to_handで 1手札ずつ作る
+
+    Attributes:
+        ids: カードの通し番号の (N, 5)の配列(読み出し専用)
+        scores: 評価値の列(int64)
+        categories: 役(PokerHandEnumの値)の列(uint8)
+
+    """
+    def __init__(self, ids, *, scores: np.ndarray | None = None,
+                 categories: np.ndarray | None = None) -> None:
+        # Raises:
+        #   ValueError: 配列の形が (N, 5)でない、または通し番号が範囲外
+        ids = np.asarray(ids)
+        if ids.ndim != 2 or ids.shape[1] != 5:
+            raise ValueError(f"expected an (N, 5) array, got {ids.shape}")
+        if ids.dtype != np.uint8:
+            if ids.size and (ids.min() < 0 or ids.max() > 51):
+                raise ValueError("card ids must be in range(52)")
+            ids = ids.astype(np.uint8)
+        elif ids.size and ids.max() > 51:
+            raise ValueError("card ids must be in range(52)")
+        self.__ids = ids
+        self.__scores = scores
+        self.__categories = categories
+
+    @classmethod
+    def from_hands(cls, hands: Iterable[Hand]) -> "HandBatch":
+        """手札のリストから作る
+        """
+        return cls(encode_hands(hands))
+
+    @classmethod
+    def deal(cls, n: int, rng: np.random.Generator | int | None = None) \
+            -> "HandBatch":
+        """n個のデッキをシャッフルして 5枚ずつ配った手札から作る
+        """
+        # デッキ全体を残さないよう、配った 5枚だけの連続した配列にする
+        return cls(np.ascontiguousarray(shuffle_decks(n, rng)[:, :5]))
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __getitem__(self, index) -> "HandBatch | PokerHand":
+        # 整数なら PokerHandを作り、スライスや配列なら HandBatchを返す
+        if isinstance(index, (int, np.integer)):
+            return self.to_hand(index)
+        return HandBatch(
+            self.__ids[index],
+            scores=None if self.__scores is None
+            else self.__scores[index],
+            categories=None if self.__categories is None
+            else self.__categories[index])
+
+    def __evaluate(self) -> None:
+        # 評価値と役の列をまとめて求める
+        major, minor = evaluate_batch(self.__ids)
+        self.__scores = major * SCORE_UNIT + minor
+        self.__categories = major.astype(np.uint8)
+
+    @property
+    def ids(self) -> np.ndarray:
+        view = self.__ids.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def scores(self) -> np.ndarray:
+        if self.__scores is None:
+            self.__evaluate()
+        return self.__scores
+
+    @property
+    def categories(self) -> np.ndarray:
+        if self.__categories is None:
+            self.__evaluate()
+        return self.__categories
+
+    @property
+    def nbytes(self) -> int:
+        """配列が使っているバイト数(評価済みの列を含む)
+        """
+        return sum(a.nbytes for a in (self.__ids, self.__scores,
+                                      self.__categories) if a is not None)
+
+    def name(self, i: int) -> str:
+        """i番目の手札の役名
+        """
+        return HAND_NAMES[PokerHandEnum(int(self.categories[i]))]
+
+    def to_hand(self, i: int, name: str = "") -> PokerHand:
+        """i番目の手札の PokerHandを作る
+        """
+        hand = PokerHand(name)
+        for card_id in self.__ids[i]:
+            hand.append(PokerCard.from_id(int(card_id)))
+        return hand
+
+    def sort(self, *, reverse: bool = True) -> "HandBatch":
+        """評価値の順に並べ替えた HandBatchを返す
+
+        Args:
+            reverse: Trueなら強い順(評価値が同じ手札は元の順番を保つ)
+        """
+        scores = self.scores
+        order = np.argsort(-scores if reverse else scores, kind="stable")
+        return self[order]
+
+    def filter(self, *categories: PokerHandEnum) -> "HandBatch":
+        """指定した役の手札だけを残した HandBatchを返す
+        """
+        return self[np.isin(self.categories, np.array(categories))]
+
+    def counts(self) -> dict[PokerHandEnum, int]:
+        """役ごとの手札の数
+        """
+        counts = np.bincount(self.categories,
+                             minlength=max(PokerHandEnum) + 1)
+        return {e: int(counts[e]) for e in PokerHandEnum if counts[e]}
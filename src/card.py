@@ -4,10 +4,14 @@
     * class Card: トランプのカード 1枚を表すクラス
     * class Deck: トランプ一式(山札)を表すクラス
     * class Hand: トランプの手札を表すクラス
+    * class CardList: 変更を持ち主に通知するカードのリスト
+    * class BitHand: 手札の構成をビットマスクで管理する手札クラス
+    * spawn_rngs: 1つの seedから独立した乱数生成器を複数作る
 
 """
+from array import array
 from enum import IntEnum, auto
-from random import shuffle
+import random
 from typing import TypeVar, Callable, Iterable
 
 
@@ -31,23 +35,88 @@ class Suit(IntEnum):
 class Card:
     """トランプのカード 1枚を表すクラス
 
+    同じクラス・スート・番号のカードは 1つのインスタンスを共有する
+    (Card(Suit.SPADE, 1) is Card(Suit.SPADE, 1))
+    等価と大小の比較はカードの強さで行い、ハッシュ値も強さから求める
+    (強さが同じなら別のカードでも等しい)
+    カードそのものを区別するキーには通し番号(id)かビット(mask)を使う
+
     Attributes
         numbers: カードで使える値のレンジオブジェクト
         suit: スート
         number: 番号(1(A), 2, 3, ... , 10, 11(J), 12(Q), 13(K))
         strength: カードの強さ
+        id: カードの通し番号((スート - 1) * 13 + 番号 - 1、ジョーカーは 52以降)
+        mask: 通し番号のビット(1 << id)
+        rank_bit: 番号のビット(1 << (番号 - 1)、ジョーカーは 0)
 
     """
     Self = TypeVar('Self', bound="Card")
 
+    __slots__ = ("__suit", "__number", "_strength", "id", "mask", "rank_bit")
+
     numbers = range(1, 13+1)
     # __NUM_DISP: カード番号の表示名のリスト
     __NUM_DISP = ["", "A", "J", "Q", "K"]
     __NUM_DISP[2:2] = [str(n) for n in range(2, 10+1)]
+    # __interned: 通し番号からインスタンスを引く辞書(クラスごとに持つ)
+    __interned: dict[int, "Card"] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.__interned = {}
+
+    def __new__(cls, suit: Suit, number: int) -> "Card":
+        number = int(number)
+        card_id = cls.card_id(suit, number)
+        card = cls.__interned.get(card_id)
+        if card is None:
+            card = super().__new__(cls)
+            card.__suit = Suit(suit)
+            card.__number = number
+            card.id = card_id
+            card.mask = 1 << card_id
+            card.rank_bit = 0 if suit == Suit.JOKER else 1 << (number - 1)
+            card._strength = cls._strength_of(card.__suit, number)
+            cls.__interned[card_id] = card
+        return card
+
+    def __reduce__(self):
+        # 復元時も共有インスタンスを使う
+        return self.__class__, (self.__suit, self.__number)
+
+    @classmethod
+    def card_id(cls, suit: Suit, number: int) -> int:
+        """スートと番号からカードの通し番号を計算する
+
+        Raises:
+            ValueError: 番号が範囲外
+        """
+        if suit == Suit.JOKER:
+            if number not in (0, 1):
+                raise ValueError(f"invalid joker number: {number}")
+            return 52 + number
+        if number not in cls.numbers:
+            raise ValueError(f"invalid card number: {number}")
+        return (suit - 1) * 13 + number - 1
+
+    @classmethod
+    def from_id(cls, card_id: int) -> "Card":
+        """通し番号からカードを得る
+        """
+        card = cls.__interned.get(card_id)
+        if card is not None:
+            return card
+        if card_id >= 52:
+            return cls(Suit.JOKER, card_id - 52)
+        suit, number = divmod(card_id, 13)
+        return cls(Suit(suit + 1), number + 1)
 
-    def __init__(self, suit: Suit, number: int) -> None:
-        self.__suit = suit
-        self.__number = int(number)
+    @staticmethod
+    def _strength_of(suit: Suit, number: int) -> int:
+        # カードの強さを計算する(インスタンスを作るときに 1度だけ呼ばれる)
+        # デフォルトではスートを考慮し、Aを 1とする
+        return suit * 100 + number
 
     def __str__(self) -> str:
         if self.__suit == Suit.JOKER:
@@ -56,46 +125,45 @@ class Card:
         # サブクラスでオーバーライドしてもオーバーライド先を参照してくれる
         return "-".join([str(self.__suit), self.__NUM_DISP[self.__number]])
 
-    # デコレータ
-    @staticmethod
-    def typecheck(func: Callable[[Self, Self], bool]) \
-            -> Callable[[Self, Self], bool]:
-        # 型チェックデコレータ
-        # 比較演算で使用する
-        # selfと otherの型が異なる場合、TypeErrorを上げる
-        # なぜか型ヒントが書けないのでしかたなくデコレータで実装
-        # 3.11 なら typing.Self が使える
-        def _typecheck(self, other) -> bool:
-            if not isinstance(other, type(self)):
-                raise TypeError
-            v = func(self, other)
-            return v
-        return _typecheck
-
-    # 比較演算
-    @typecheck
+    # 比較演算(カードの強さで比べる)
+    # selfと otherの型が異なる場合、TypeErrorを上げる
+    # 同じクラス同士の比較が大半なので、先にクラスの一致を調べる
     def __eq__(self: Self, other: Self) -> bool:
-        return self.strength == other.strength
+        if other.__class__ is not self.__class__ \
+                and not isinstance(other, self.__class__):
+            raise TypeError
+        return self._strength == other._strength
+
+    def __ne__(self: Self, other: Self) -> bool:
+        return not self.__eq__(other)
+
+    def __hash__(self) -> int:
+        # 等しい(強さが同じ)カードは同じハッシュ値になる
+        return hash(self._strength)
 
-    @typecheck
     def __lt__(self: Self, other: Self) -> bool:
-        return self.strength < other.strength
+        if other.__class__ is not self.__class__ \
+                and not isinstance(other, self.__class__):
+            raise TypeError
+        return self._strength < other._strength
 
-    @typecheck
     def __le__(self: Self, other: Self) -> bool:
-        return self.strength <= other.strength
+        if other.__class__ is not self.__class__ \
+                and not isinstance(other, self.__class__):
+            raise TypeError
+        return self._strength <= other._strength
 
-    @typecheck
     def __gt__(self: Self, other: Self) -> bool:
-        return self.strength > other.strength
+        if other.__class__ is not self.__class__ \
+                and not isinstance(other, self.__class__):
+            raise TypeError
+        return self._strength > other._strength
 
-    @typecheck
     def __ge__(self: Self, other: Self) -> bool:
-        return self.strength >= other.strength
-
-    @typecheck
-    def __ne__(self: Self, other: Self) -> bool:
-        return not self.__eq__(other)
+        if other.__class__ is not self.__class__ \
+                and not isinstance(other, self.__class__):
+            raise TypeError
+        return self._strength >= other._strength
 
     @property
     def strength(self) -> int:
@@ -103,7 +171,7 @@ class Card:
 
         デフォルトではスートを考慮し、Aを 1とする
         """
-        return self.__suit * 100 + self.__number
+        return self._strength
 
     @property
     def suit(self) -> Suit:
@@ -118,40 +186,84 @@ class Deck:
     """ トランプの 1セット
 
     イテラブルとして使用できる
+    カードは通し番号(Card.id)の配列で持ち、取り出すときにカードに変換する
+    rngを指定するとそのデッキ専用の乱数生成器でシャッフルする
 
     Attributes:
         len: 残りカード枚数
+        rng: シャッフルに使う乱数生成器(Noneならモジュール randomの関数)
 
     """
     TCard = TypeVar('TCard', bound="Card")
 
-    def __init__(self, *, card_cls: type[TCard] = Card, joker: bool = True) \
-            -> None:
+    # __LAYOUTS: (カードのクラス, ジョーカーの枚数) ごとの
+    #            (初期状態の通し番号の配列, 通し番号からカードを引くリスト)
+    __LAYOUTS: dict[tuple[type, int], tuple[array, list[Card]]] = {}
+
+    def __init__(self, *, card_cls: type[TCard] = Card,
+                 joker: bool | int = True,
+                 rng: random.Random | None = None) -> None:
         # デッキを作る
         # Keyword parameters:
-        #   joker(bool): ジョーカーを含むかどうか
+        #   joker(bool | int): ジョーカーを含むかどうか、または枚数(0 ~ 2)
         #   card_cls(Class): デッキで使うクラスを指定する(デフォルト Card)
-        self.__cards = [card_cls(s, n)
-                        for s in Suit
-                        for n in card_cls.numbers if s != Suit.JOKER
-                        ]
-        if joker:
-            self.__cards.append(card_cls(Suit.JOKER, 0))
+        #   rng(random.Random): シャッフルに使う乱数生成器(デフォルト None)
+        # Raises:
+        #   ValueError: ジョーカーの枚数が範囲外
+        jokers = int(joker)
+        if not 0 <= jokers <= 2:
+            raise ValueError(f"a deck holds 0 to 2 jokers: {joker}")
+        self.rng = rng
+        layout = Deck.__LAYOUTS.get((card_cls, jokers))
+        if layout is None:
+            cards = [card_cls(s, n)
+                     for s in Suit
+                     for n in card_cls.numbers if s != Suit.JOKER
+                     ]
+            # 2枚目のジョーカーは番号 1(通し番号 53)
+            cards += [card_cls(Suit.JOKER, n) for n in range(jokers)]
+            table: list[Card] = [None] * (max(c.id for c in cards) + 1)
+            for c in cards:
+                table[c.id] = c
+            layout = array('B', [c.id for c in cards]), table
+            Deck.__LAYOUTS[(card_cls, jokers)] = layout
+        self.__initial, self.__table = layout
+        self.__ids = array('B', self.__initial)
 
     def __iter__(self) -> Iterable[Card]:
         # イテラブルとして参照されたときの動作
         # カードは取り除かれないことに注意
-        yield from self.__cards
+        table = self.__table
+        for i in self.__ids:
+            yield table[i]
 
     def __str__(self) -> str:
         # デッキの内容をすべて表示する
-        s = '\n'.join(map(str, self.__cards))
+        s = '\n'.join(map(str, self))
         return s
 
-    def shuffle(self) -> None:
+    def reset(self) -> None:
+        """デッキを作り直さずに、作ったときの状態(順番)に戻す
+        """
+        self.__ids[:] = self.__initial
+
+    def shuffle(self, count: int | None = None) -> None:
         """デッキをシャッフルする
+
+        Args:
+            count: 次に取り出す枚数(指定すると、その枚数分だけ
+                   Fisher-Yates法で無作為に選んでデッキの末尾に置く)
         """
-        shuffle(self.__cards)
+        rng = random if self.rng is None else self.rng
+        ids = self.__ids
+        if count is None:
+            rng.shuffle(ids)
+            return
+        n = len(ids)
+        randrange = rng.randrange
+        for i in range(n - 1, max(n - count, 1) - 1, -1):
+            j = randrange(i + 1)
+            ids[i], ids[j] = ids[j], ids[i]
 
     def draw(self) -> Card:
         """デッキからカードを 1枚取り出す
@@ -163,7 +275,26 @@ class Deck:
             IndexError: デッキが空
 
         """
-        return self.__cards.pop()
+        return self.__table[self.__ids.pop()]
+
+    def draw_many(self, n: int) -> list[Card]:
+        """デッキからカードを n枚まとめて取り出す
+
+        drawを n回呼んだときと同じ順番でカードを返す
+
+        Raises:
+            IndexError: デッキの残りが n枚より少ない
+
+        """
+        ids = self.__ids
+        if n > len(ids):
+            raise IndexError("not enough cards in the deck")
+        if n <= 0:
+            return []
+        table = self.__table
+        drawn = [table[i] for i in reversed(ids[-n:])]
+        del ids[-n:]
+        return drawn
 
     def sort(self, *, reverse: bool = False):
         """デッキのカードを並べ替える
@@ -171,13 +302,90 @@ class Deck:
         Args:
             reverse: 並べ替える順序(True=降順, False=昇順)
         """
-        self.__cards.sort(reverse=reverse)
+        table = self.__table
+        self.__ids[:] = array('B', sorted(self.__ids,
+                                          key=lambda i: table[i].strength,
+                                          reverse=reverse))
 
     @property
     def len(self) -> int:
         """残りカード枚数
         """
-        return len(self.__cards)
+        return len(self.__ids)
+
+
+def spawn_rngs(seed: int | None, n: int) -> list[random.Random]:
+    """1つの seedから独立した乱数生成器を n個作る
+
+    テーブルごと・ワーカーごとに別の乱数列を使いたいときに使う
+    seedが同じなら同じ乱数生成器の列ができるので、ゲームを再現できる
+    """
+    master = random.Random(seed)
+    return [random.Random(master.getrandbits(128)) for _ in range(n)]
+
+
+class CardList(list):
+    """変更を持ち主に通知するカードのリスト
+
+    Hand.cardsとして使い、要素が変わるたびに持ち主の _changed()を呼ぶ
+    del hand.cards[0] のような直接の操作も検出できる
+    1枚だけ取り除く操作(pop, remove, 1つのインデックスの del)のときは
+    取り除いたカードを引数に渡す
+    appendは最もよく使うので _changed()を呼ばず、持ち主のキャッシュだけを捨てる
+    """
+    __slots__ = ("_owner",)
+
+    def __init__(self, owner: "Hand", cards: Iterable[Card] = ()) -> None:
+        # 手札を作るたびに呼ばれるので、空のときは list.__init__を呼ばない
+        if cards:
+            list.extend(self, cards)
+        self._owner = owner
+
+    def __notify(method: Callable) -> Callable:
+        # リストを変更するメソッドを呼んだ後で持ち主に通知するデコレータ
+        def _notify(self, *args, **kwargs):
+            v = method(self, *args, **kwargs)
+            self._owner._changed()
+            return v
+        return _notify
+
+    __setitem__ = __notify(list.__setitem__)
+    __iadd__ = __notify(list.__iadd__)
+    __imul__ = __notify(list.__imul__)
+    extend = __notify(list.extend)
+    insert = __notify(list.insert)
+    clear = __notify(list.clear)
+    sort = __notify(list.sort)
+    reverse = __notify(list.reverse)
+    del __notify
+
+    def append(self, card: Card) -> None:
+        list.append(self, card)
+        self._owner._cached = None
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            super().__delitem__(index)
+            self._owner._changed()
+            return
+        card = self[index]
+        super().__delitem__(index)
+        self._owner._changed(removed=card)
+
+    def pop(self, index: int = -1) -> Card:
+        card = super().pop(index)
+        self._owner._changed(removed=card)
+        return card
+
+    def remove(self, card: Card) -> None:
+        # 強さが同じ別のカードが取り除かれることもあるので、
+        # 実際に取り除いたカードを通知する
+        removed = super().pop(self.index(card))
+        self._owner._changed(removed=removed)
+
+    def __reduce__(self):
+        # pickle時に持ち主と要素をまとめて復元する
+        return self.__class__, (self._owner, list(self))
 
 
 class Hand:
@@ -192,8 +400,11 @@ class Hand:
 
     """
     def __init__(self, name: str = "") -> None:
-        self.__cards: list[Card] = []
+        self.__cards: list[Card] = CardList(self)
         self.name: str = name
+        # 手札から求めた値のキャッシュ(サブクラスで使う)
+        # 手札が変わると Noneに戻す
+        self._cached = None
 
     def __str__(self) -> str:
         # 手札を文字列化する
@@ -203,8 +414,16 @@ class Hand:
     def append(self, card: Card) -> None:
         """カードを 1枚追加する
 
+        配るときに何度も呼ばれるので、リストに加えてキャッシュを捨てるだけにする
         """
-        self.__cards.append(card)
+        list.append(self.__cards, card)
+        self._cached = None
+
+    def _changed(self, removed: Card | None = None) -> None:
+        # 手札のリストが append以外の方法で変更されたときに CardListから呼ばれる
+        # removedは 1枚だけ取り除いたカード(それ以外の変更では None)
+        # サブクラスで追加の状態を捨てるときはオーバーライドする
+        self._cached = None
 
     @property
     def cards(self) -> list[Card]:
@@ -222,7 +441,172 @@ class Hand:
 
     @property
     def suits(self) -> set[Suit]:
-        """手札に含まれるスートの集合
+        """手札に含まれるスートの集合(ジョーカーを除く)
         """
-        self.__suits = {card.suit for card in self.__cards}
+        self.__suits = {card.suit for card in self.__cards
+                        if card.suit != Suit.JOKER}
         return self.__suits
+
+
+class BitHand(Hand):
+    """手札の構成をビットマスクで管理する手札クラス
+
+    スートや番号の構成をビット演算で調べられる
+    ビットマスクはカードを追加するときには作らず、最初に参照したときに作る
+    一度作ったあとは、追加されたカードと 1枚ずつ取り除かれたカードの分だけ
+    更新する(それ以外の変更があったときは次に参照したときに作り直す)
+    nums, suitsも手札が変わるまで使い回す
+
+    Attributes:
+        mask: 手札のカードの通し番号のビットの論理和(スートごとに 13ビット)
+        rank_mask: 手札に含まれる番号のビット
+        jokers: 手札に含まれるジョーカーの枚数
+        canonical_key: スートの入れ替えで移り合う手札に共通のキー
+
+    """
+    # 1スート分(13ビット)のマスク
+    SUIT_BITS = (1 << 13) - 1
+
+    def __init__(self, name: str = "") -> None:
+        super().__init__(name)
+        # __synced: ビットマスクに反映済みの先頭からのカードの枚数
+        #           (-1なら作り直す、最初に参照したときに作る)
+        self.__synced = -1
+
+    def __reset(self) -> None:
+        # ビットマスクを空の手札の状態にする
+        self.__mask = 0
+        # __rank_sets[k]: k + 1枚以上ある番号のビット
+        self.__rank_sets = [0, 0, 0, 0]
+        self.__jokers = 0
+        self.__nums: list[int] | None = None
+        self.__suits: set[Suit] | None = None
+
+    def __add(self, card: Card) -> None:
+        # カード 1枚分ビットマスクを更新する
+        if card.suit == Suit.JOKER:
+            self.__jokers += 1
+            return
+        self.__mask |= card.mask
+        bit = card.rank_bit
+        sets = self.__rank_sets
+        for k in range(4):
+            if not sets[k] & bit:
+                sets[k] |= bit
+                break
+
+    def __remove(self, card: Card) -> None:
+        # カード 1枚分ビットマスクから取り除く
+        if card.suit == Suit.JOKER:
+            self.__jokers -= 1
+            return
+        self.__mask &= ~card.mask
+        bit = card.rank_bit
+        sets = self.__rank_sets
+        for k in range(3, -1, -1):
+            if sets[k] & bit:
+                sets[k] &= ~bit
+                break
+
+    def __sync(self) -> None:
+        # 前回から追加されたカードをビットマスクに反映する
+        # 追加以外の変更があった場合はビットマスクを作り直す
+        cards = self.cards
+        n = self.__synced
+        if n == len(cards):
+            return
+        if not 0 <= n < len(cards):
+            self.__reset()
+            n = 0
+        for card in cards[n:]:
+            self.__add(card)
+        self.__synced = len(cards)
+        self.__nums = None
+        self.__suits = None
+
+    def _changed(self, removed: Card | None = None) -> None:
+        # 追加されたカードは次に参照したときにまとめて反映するので、
+        # ここに来るのは追加以外の変更
+        # 反映済みの手札から 1枚取り除いたときだけ、その 1枚分を更新する
+        n = self.__synced
+        if removed is not None and n == len(self.cards) + 1:
+            self.__remove(removed)
+            self.__synced = n - 1
+            self.__nums = None
+            self.__suits = None
+        else:
+            self.__synced = -1
+        super()._changed(removed)
+
+    @property
+    def mask(self) -> int:
+        self.__sync()
+        return self.__mask
+
+    @property
+    def rank_mask(self) -> int:
+        self.__sync()
+        return self.__rank_sets[0]
+
+    @property
+    def jokers(self) -> int:
+        self.__sync()
+        return self.__jokers
+
+    def suit_mask(self, suit: Suit) -> int:
+        """スートに含まれる番号のビットを返す
+        """
+        self.__sync()
+        return (self.__mask >> 13 * (suit - 1)) & self.SUIT_BITS
+
+    def kinds(self, n: int) -> int:
+        """n枚以上ある番号のビットを返す(n = 1..4)
+        """
+        self.__sync()
+        return self.__rank_sets[n - 1]
+
+    @property
+    def canonical_key(self) -> tuple[int, ...]:
+        """スートの入れ替えで移り合う手札に共通のキー
+
+        (ジョーカーの枚数, スートごとの番号のビットを降順に並べたもの)
+        スートの名前によらず構成が同じ手札は同じキーになるので、
+        評価結果のキャッシュなどのキーに使う
+        """
+        self.__sync()
+        m, bits = self.__mask, self.SUIT_BITS
+        return (self.__jokers,) + tuple(sorted(
+            (m & bits, m >> 13 & bits, m >> 26 & bits, m >> 39 & bits),
+            reverse=True))
+
+    @property
+    def groups(self) -> list[int]:
+        """同じ番号の枚数を降順に並べたリスト(ジョーカーを除く)
+        """
+        self.__sync()
+        sets = self.__rank_sets + [0]
+        g = []
+        for k in range(4, 0, -1):
+            g += [k] * (sets[k - 1] & ~sets[k]).bit_count()
+        return g
+
+    @property
+    def nums(self) -> list[int]:
+        """手札の強さのリスト
+
+        手札の番号ではないことに注意。
+        """
+        self.__sync()
+        if self.__nums is None:
+            self.__nums = [card.strength for card in self.cards]
+        return list(self.__nums)
+
+    @property
+    def suits(self) -> set[Suit]:
+        """手札に含まれるスートの集合(ジョーカーを除く)
+        """
+        self.__sync()
+        if self.__suits is None:
+            self.__suits = {s for s in Suit
+                            if s != Suit.JOKER and self.suit_mask(s)}
+        return set(self.__suits)
@@ -0,0 +1,412 @@
+""" ポーカーの勝率を計算するモジュール
+
+    * class Equity: プレーヤー 1人分の勝ち・引き分け・負けの回数
+    * simulate: 残りのカードを何度も配り直して勝率を見積もる(モンテカルロ法)
+    * class ExactOdds: 残りのカードの組み合わせをすべて数えて正確な確率を求める
+
+"""
+import os
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from random import Random
+from typing import Iterable, NamedTuple
+
+from card import Card, Deck, spawn_rngs
+from poker import PokerCard, PokerHandEnum, SCORE_UNIT, score_table
+
+
+class Equity(NamedTuple):
+    """プレーヤー 1人分の勝ち・引き分け・負けの回数
+
+    Attributes:
+        wins: 単独で勝った回数
+        ties: 最強の手札が複数あった回数
+        losses: 負けた回数
+        trials: 試行回数
+
+    """
+    wins: int
+    ties: int
+    losses: int
+    trials: int
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.trials if self.trials else 0.0
+
+    @property
+    def tie_rate(self) -> float:
+        return self.ties / self.trials if self.trials else 0.0
+
+    @property
+    def loss_rate(self) -> float:
+        return self.losses / self.trials if self.trials else 0.0
+
+
+def _card_ids(hands: list[Iterable[Card]], dead: Iterable[Card]) \
+        -> tuple[list[list[int]], list[int]]:
+    # 既知のカードの通し番号と、残りのカードの通し番号を返す
+    # Raises:
+    #   ValueError: ジョーカー、6枚以上の手札、同じカードの重複
+    known = [[c.id for c in hand] for hand in hands]
+    used = [i for k in known for i in k] + [c.id for c in dead]
+    if any(len(k) > 5 for k in known):
+        raise ValueError("a hand has more than 5 cards")
+    if any(i >= 52 for i in used):
+        raise ValueError("jokers are not supported")
+    if len(set(used)) != len(used):
+        raise ValueError("the same card is used twice")
+    used_set = set(used)
+    remaining = [c.id for c in Deck(card_cls=PokerCard, joker=False)
+                 if c.id not in used_set]
+    if sum(5 - len(k) for k in known) > len(remaining):
+        raise ValueError("not enough cards left in the deck")
+    return known, remaining
+
+
+def _showdown(scores: list[int], wins: list[int], ties: list[int]) -> None:
+    # 1回分の勝敗を数える
+    best = max(scores)
+    winners = [i for i, s in enumerate(scores) if s == best]
+    if len(winners) == 1:
+        wins[winners[0]] += 1
+    else:
+        for i in winners:
+            ties[i] += 1
+
+
+def _run_shard(args: tuple[list[list[int]], list[int], int, Random]) \
+        -> tuple[list[int], list[int]]:
+    # ワーカーで実行する 1単位分の試行
+    # 独立した乱数列を使うため、シャードごとに乱数生成器を受け取る
+    known, remaining, trials, rng = args
+    lookup = score_table().lookup_ids
+    need = [5 - len(k) for k in known]
+    total = sum(need)
+    wins = [0] * len(known)
+    ties = [0] * len(known)
+    for _ in range(trials):
+        drawn = rng.sample(remaining, total)
+        scores = []
+        pos = 0
+        for k, n in zip(known, need):
+            scores.append(lookup(k + drawn[pos:pos + n]))
+            pos += n
+        _showdown(scores, wins, ties)
+    return wins, ties
+
+
+def simulate(hands: list[Iterable[Card]], dead: Iterable[Card] = (), *,
+             trials: int = 10000, seed: int | None = None,
+             shards: int = 16, workers: int | None = None) -> list[Equity]:
+    """残りのカードを何度も配り直して勝率を見積もる
+
+    各プレーヤーの手札が 5枚になるまで残りのカードから配り、役の強さを比べる
+    試行は shards個に分けて、それぞれ seedから作った独立した乱数列で実行する
+    結果はシャードの順に合計するので、seedと shardsが同じなら
+    workersの数によらず同じ結果になる
+
+    Args:
+        hands: プレーヤーごとの既知のカード(0 ~ 5枚)
+        dead: 誰にも配られないことがわかっているカード
+        trials: 試行回数
+        seed: 乱数の種(Noneなら毎回異なる)
+        shards: 試行を分割する数
+        workers: プロセス数(Noneなら CPU数、1ならプロセスを使わない)
+
+    Returns:
+        プレーヤーごとの Equity
+
+    Raises:
+        ValueError: カードの指定が正しくない
+
+    """
+    known, remaining = _card_ids(list(hands), dead)
+    shards = max(1, min(shards, trials))
+    base, extra = divmod(trials, shards)
+    work = [(known, remaining, base + (i < extra), rng)
+            for i, rng in enumerate(spawn_rngs(seed, shards))]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        results = list(map(_run_shard, work))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_shard, work))
+
+    wins = [0] * len(known)
+    ties = [0] * len(known)
+    for w, t in results:
+        for i in range(len(known)):
+            wins[i] += w[i]
+            ties[i] += t[i]
+    return [Equity(w, t, trials - w - t, trials) for w, t in zip(wins, ties)]
+
+
+# ---------------------------------------------------------------
+# 全数列挙
+# ---------------------------------------------------------------
+# 組み合わせの途中経過を 1つの整数(キー)で表す
+#   上位: rankごとの素数の積(並び順によらず rankの重複組み合わせが決まる)
+#   下位 16ビット: スートがそろっている場合だけ (スート + 1) << 13 | rankのビット
+_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+# スートがまだ決まっていない(カードがない)状態とそろっていない状態
+_NO_SUIT = 4
+_MIXED = -1
+
+
+def _card_parts(card_id: int) -> tuple[int, int, int]:
+    # 通し番号から (rankの素数, rankのビット, スート(0..3)) を得る
+    suit, number = divmod(card_id, 13)
+    rank = 12 if number == 0 else number - 1
+    return _PRIMES[rank], 1 << rank, suit
+
+
+def _key(product: int, suit: int, mask: int) -> int:
+    if suit == _MIXED:
+        return product << 16
+    return (product << 16) | ((suit + 1) << 13) | mask
+
+
+def _join_suit(a: int, b: int) -> int:
+    # 2つのカードの集まりのスートの状態を合わせる
+    if a == _NO_SUIT:
+        return b
+    if b == _NO_SUIT or a == b:
+        return a
+    return _MIXED
+
+
+def _sweep(cards: tuple[list[int], list[int], list[int]], m: int,
+           counts: Counter, start: int = 0, product: int = 1,
+           suit: int = _NO_SUIT, mask: int = 0) -> None:
+    # cardsの start以降から m枚選ぶ組み合わせをすべて数えて countsに加える
+    # 途中までの積・スート・ビットは 1つ上の段の結果を使い回す
+    primes, bits, suits = cards
+    n = len(primes)
+    if m == 0:
+        counts[_key(product, suit, mask)] += 1
+    elif m == 1:
+        base = product << 16
+        if suit == _MIXED:
+            counts.update([base * primes[i] for i in range(start, n)])
+        else:
+            counts.update([
+                base * primes[i] | ((suits[i] + 1) << 13) | mask | bits[i]
+                if suit == _NO_SUIT or suit == suits[i]
+                else base * primes[i]
+                for i in range(start, n)])
+    else:
+        for i in range(start, n - m + 1):
+            s = _join_suit(suit, suits[i])
+            _sweep(cards, m - 1, counts, i + 1, product * primes[i], s,
+                   mask | bits[i] if s != _MIXED else 0)
+
+
+class ExactOdds:
+    """残りのカードの組み合わせをすべて数えて正確な確率を求める
+
+    PokerCardや PokerHandは作らず、カードの通し番号だけで数える
+    組み合わせの数え上げの結果は保存しておき、既知のカードが 1枚変わった
+    ときはそのカードを含む組み合わせだけを数え直す
+
+    Attributes:
+        maxsize: 1対 1の比較のために保存する手札の数
+
+    """
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        # 前回数えた残りのカード・枚数・組み合わせのキーごとの数
+        self.__remaining: set[int] = set()
+        self.__m = -1
+        self.__counts: Counter = Counter()
+        # 素数の積から評価値を引くキャッシュ
+        self.__products: dict[int, int] = {}
+        # 1対 1の比較で使う手札ごとの (組み合わせのビット, 評価値) のリスト
+        self.__completions: OrderedDict = OrderedDict()
+
+    def __parts(self, ids: Iterable[int]) \
+            -> tuple[list[int], list[int], list[int]]:
+        parts = [_card_parts(i) for i in ids]
+        return ([p[0] for p in parts], [p[1] for p in parts],
+                [p[2] for p in parts])
+
+    def __score(self, product: int, suit: int, mask: int) -> int:
+        # 5枚分のキーから評価値を求める
+        table = score_table()
+        if suit != _MIXED:
+            return table.flush[mask]
+        score = self.__products.get(product)
+        if score is None:
+            ranks = []
+            rest = product
+            for r, q in enumerate(_PRIMES):
+                while rest % q == 0:
+                    ranks.append(r)
+                    rest //= q
+            score = table.unsuited[table.index(ranks)]
+            self.__products[product] = score
+        return score
+
+    def __update(self, remaining: set[int], m: int) -> None:
+        # 残りのカードから m枚選ぶ組み合わせの数を最新にする
+        old = self.__remaining
+        removed = old - remaining
+        added = remaining - old
+        if self.__m != m or m == 0 \
+                or (len(removed) + len(added)) * m >= len(remaining):
+            # 数え直したほうが速い
+            self.__counts = Counter()
+            _sweep(self.__parts(sorted(remaining)), m, self.__counts)
+            self.__remaining = set(remaining)
+            self.__m = m
+            return
+        current = set(old)
+        for x in removed:
+            # xを含む組み合わせを取り除く
+            current.discard(x)
+            diff: Counter = Counter()
+            p, b, s = _card_parts(x)
+            _sweep(self.__parts(sorted(current)), m - 1, diff,
+                   product=p, suit=s, mask=b)
+            self.__counts.subtract(diff)
+        for y in added:
+            # yを含む組み合わせを加える
+            diff = Counter()
+            p, b, s = _card_parts(y)
+            _sweep(self.__parts(sorted(current)), m - 1, diff,
+                   product=p, suit=s, mask=b)
+            self.__counts.update(diff)
+            current.add(y)
+        self.__remaining = current
+
+    def distribution(self, known: Iterable[Card] = (),
+                     dead: Iterable[Card] = ()) -> Counter:
+        """手札の残りを配るすべての組み合わせについて役ごとの数を数える
+
+        knownが空なら C(52, 5) = 2,598,960通りすべての手札を数える
+
+        Args:
+            known: 手札の既知のカード(0 ~ 5枚)
+            dead: 配られないことがわかっているカード
+
+        Returns:
+            PokerHandEnumごとの組み合わせの数
+
+        Raises:
+            ValueError: カードの指定が正しくない
+
+        """
+        (known_ids,), remaining = _card_ids([known], dead)
+        m = 5 - len(known_ids)
+        self.__update(set(remaining), m)
+
+        kp = 1
+        ks = _NO_SUIT
+        km = 0
+        for i in known_ids:
+            p, b, s = _card_parts(i)
+            kp *= p
+            ks = _join_suit(ks, s)
+            km |= b
+        result: Counter = Counter()
+        for key, n in self.__counts.items():
+            if not n:
+                continue
+            code = key & 0xFFFF
+            suit = _join_suit(ks, (code >> 13) - 1 if code else _MIXED)
+            score = self.__score(kp * (key >> 16), suit,
+                                 km | (code & 0x1FFF))
+            result[PokerHandEnum(score // SCORE_UNIT)] += n
+        return result
+
+    def __completion_scores(self, known: list[int], dead: list[int]) \
+            -> list[tuple[int, int]]:
+        # 手札の残りを配るすべての組み合わせの (ビット, 評価値) を返す
+        # 相手の手札に依存しないので、相手のカードが変わっても使い回せる
+        key = (frozenset(known), frozenset(dead))
+        cached = self.__completions.get(key)
+        if cached is not None:
+            self.__completions.move_to_end(key)
+            return cached
+        used = set(known) | set(dead)
+        remaining = [i for i in range(52) if i not in used]
+        lookup = score_table().lookup_ids
+        cached = []
+        for combo in combinations(remaining, 5 - len(known)):
+            bits = 0
+            for i in combo:
+                bits |= 1 << i
+            cached.append((bits, lookup(known + list(combo))))
+        self.__completions[key] = cached
+        if len(self.__completions) > self.maxsize:
+            self.__completions.popitem(last=False)
+        return cached
+
+    def head_to_head(self, hand_a: Iterable[Card], hand_b: Iterable[Card],
+                     dead: Iterable[Card] = ()) -> tuple[Equity, Equity]:
+        """2人の手札の残りを配るすべての組み合わせで勝敗を数える
+
+        それぞれの残りの組み合わせを 1度ずつ評価し、2人目の評価値を
+        共通のカードの組ごとに並べておいて、1人目の組み合わせごとに
+        二分探索で勝ち・引き分け・負けの数を求める
+        (カードが重なる組み合わせは包除原理で除く)
+
+        Returns:
+            (1人目の Equity, 2人目の Equity)
+
+        Raises:
+            ValueError: カードの指定が正しくない
+
+        """
+        dead = list(dead)
+        (a, b), _ = _card_ids([hand_a, hand_b], dead)
+        dead_ids = [c.id for c in dead]
+        a_bits = sum(1 << i for i in a)
+        b_bits = sum(1 << i for i in b)
+        scores_a = self.__completion_scores(a, dead_ids)
+        scores_b = self.__completion_scores(b, dead_ids)
+
+        # by_cards[s]: カードの組 sをすべて含む 2人目の組み合わせの評価値
+        by_cards: defaultdict[int, list[int]] = defaultdict(list)
+        for bits_b, score_b in scores_b:
+            if bits_b & a_bits:
+                continue
+            sub = bits_b
+            while True:
+                by_cards[sub].append(score_b)
+                if not sub:
+                    break
+                sub = (sub - 1) & bits_b
+        for scores in by_cards.values():
+            scores.sort()
+
+        wins = ties = losses = 0
+        for bits_a, score_a in scores_a:
+            if bits_a & b_bits:
+                continue
+            # 1人目の組み合わせと重ならない 2人目の組み合わせを、
+            # 共通のカードの組ごとに符号を付けて足し引きして数える
+            sub = bits_a
+            while True:
+                scores = by_cards.get(sub)
+                if scores:
+                    low = bisect_left(scores, score_a)
+                    high = bisect_right(scores, score_a)
+                    if sub.bit_count() & 1:
+                        wins -= low
+                        ties -= high - low
+                        losses -= len(scores) - high
+                    else:
+                        wins += low
+                        ties += high - low
+                        losses += len(scores) - high
+                if not sub:
+                    break
+                sub = (sub - 1) & bits_a
+        trials = wins + ties + losses
+        return (Equity(wins, ties, losses, trials),
+                Equity(losses, ties, wins, trials))
@@ -0,0 +1,314 @@
+""" ドローポーカーのカード交換を自動で決めるモジュール
+
+    手札 5枚から捨てるカードの選び方 32通りすべてについて、
+    残りのカードから引き直したときの評価値の期待値を求め、最も大きいものを選ぶ
+    期待値はすべての組み合わせを数えて求める(抽選で見積もることもできる)
+
+    * class Decision: 捨てるカードの選び方 1通り分の評価
+    * class ExchangeEngine: 捨てるカードを決めて交換する
+
+"""
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, combinations_with_replacement
+from math import comb
+from random import Random
+from typing import Iterable, NamedTuple
+
+from card import Card, Deck
+from poker import PokerCard, PokerHand, ScoreTable, score_table
+
+
+class Decision(NamedTuple):
+    """捨てるカードの選び方 1通り分の評価
+
+    Attributes:
+        discard: 捨てるカードの位置(hand.cardsのインデックス)のタプル
+        expected: 引き直したあとの評価値の期待値
+        exact: すべての組み合わせを数えたか(Falseなら抽選による見積もり)
+
+    """
+    discard: tuple[int, ...]
+    expected: float
+    exact: bool
+
+
+class ExchangeEngine:
+    """捨てるカードを決めて交換する
+
+    期待値は既定ではすべての組み合わせを数えて求める
+    引くカードを 1枚ずつ並べる代わりに番号の重複組み合わせごとに
+    (その番号を引く組み合わせの数) * (評価値) を足し、フラッシュになる
+    組み合わせだけを別に数えて差し替える
+    番号ごとの結果は (残すカードの番号, 引ける可能性のある番号ごとの枚数) を、
+    フラッシュの結果はスートごとの番号のビットをキーとして保存するので、
+    スートや並び順が違うだけの手札と使い回せる
+
+    samplesを指定すると、組み合わせの数が samplesより多いときは
+    samples回の抽選で見積もる(乱数はカードと seedから作るので、
+    seedが同じなら評価する順番やプロセス数によらず同じ結果になる)
+
+    Attributes:
+        samples: 抽選で見積もるときの試行回数(Noneならすべて数える)
+        seed: 抽選に使う乱数の種
+        maxsize: 保存する結果の数
+
+    """
+    def __init__(self, *, samples: int | None = None, seed: int = 0,
+                 maxsize: int = 1 << 18) -> None:
+        self.samples = samples
+        self.seed = seed
+        self.maxsize = maxsize
+        self.__memo: OrderedDict[tuple, float] = OrderedDict()
+
+    @staticmethod
+    def __unseen(ids: list[int], deck: Deck | None,
+                 dead: Iterable[Card]) -> list[int]:
+        # 引ける可能性のあるカードの通し番号
+        # デッキが渡されたら、その残りのカードから引く
+        # Raises:
+        #   ValueError: 5枚でない手札、ジョーカー入り
+        if len(ids) != 5 or any(i >= 52 for i in ids):
+            raise ValueError("needs 5 cards without jokers")
+        if deck is not None:
+            return [c.id for c in deck if c.id < 52]
+        used = set(ids) | {c.id for c in dead}
+        return [i for i in range(52) if i not in used]
+
+    def __remember(self, key: tuple, value: float) -> float:
+        memo = self.__memo
+        memo[key] = value
+        if len(memo) > self.maxsize:
+            memo.popitem(last=False)
+        return value
+
+    def __recall(self, key: tuple) -> float | None:
+        memo = self.__memo
+        value = memo.get(key)
+        if value is not None:
+            memo.move_to_end(key)
+        return value
+
+    def __rank_total(self, kept: tuple[int, ...],
+                     avail: tuple[int, ...]) -> float:
+        # フラッシュを考えない評価値の合計
+        # kept: 残すカードの rank(昇順), avail: rankごとの引ける枚数
+        key = ("rank", kept, avail)
+        total = self.__recall(key)
+        if total is not None:
+            return total
+        unsuited = score_table().unsuited
+        choose = [_CHOOSE[a] for a in avail]
+        kept_code = _code(kept)
+        total = 0
+        for pairs, code in _DRAWS[5 - len(kept)]:
+            # その番号を引く組み合わせの数
+            weight = 1
+            for r, m in pairs:
+                weight *= choose[r][m]
+            if weight:
+                total += weight * unsuited[_CODE_INDEX[kept_code + code]]
+        return self.__remember(key, total)
+
+    def __flush_delta(self, kept_mask: int, avail_mask: int) -> float:
+        # 1つのスートでフラッシュになる組み合わせの評価値の差
+        # kept_mask: 残すカードの rankのビット(すべて同じスート)
+        # avail_mask: そのスートの引ける rankのビット
+        key = ("flush", kept_mask, avail_mask)
+        delta = self.__recall(key)
+        if delta is not None:
+            return delta
+        table = score_table()
+        flush, unsuited = table.flush, table.unsuited
+        ranks = [r for r in range(13) if avail_mask >> r & 1]
+        kept_code = _code(r for r in range(13) if kept_mask >> r & 1)
+        delta = 0
+        for combo in combinations(ranks, 5 - kept_mask.bit_count()):
+            mask = kept_mask
+            code = kept_code
+            for r in combo:
+                mask |= 1 << r
+                code += 1 << 3 * r
+            delta += flush[mask] - unsuited[_CODE_INDEX[code]]
+        return self.__remember(key, delta)
+
+    def __sampled(self, kept: tuple[int, ...], unseen: list[int]) -> float:
+        # 抽選で見積もった評価値の平均
+        key = ("sample", kept, tuple(unseen))
+        mean = self.__recall(key)
+        if mean is not None:
+            return mean
+        lookup = score_table().lookup_ids
+        n = 5 - len(kept)
+        rng = Random(hash((self.seed,) + key[1:]))
+        total = 0
+        for _ in range(self.samples):
+            total += lookup(kept + tuple(rng.sample(unseen, n)))
+        return self.__remember(key, total / self.samples)
+
+    def evaluate(self, hand: PokerHand, deck: Deck | None = None,
+                 dead: Iterable[Card] = ()) -> list[Decision]:
+        """捨てるカードの選び方 32通りすべての期待値を求める
+
+        Args:
+            hand: 5枚の手札
+            deck: 引き直すデッキ(Noneなら手札と deadを除いたすべてのカード)
+            dead: 引けないことがわかっているカード(deckを渡したときは使わない)
+
+        Returns:
+            捨てる枚数が少ない順の Decisionのリスト
+
+        Raises:
+            ValueError: 5枚でない手札、ジョーカー入り
+
+        """
+        ids = [c.id for c in hand.cards]
+        unseen = self.__unseen(ids, deck, dead)
+        # rankごとの引ける枚数と、スートごとの引ける rankのビット
+        avail = [0] * 13
+        suit_avail = [0] * 4
+        for i in unseen:
+            suit, rank = _parts(i)
+            avail[rank] += 1
+            suit_avail[suit] |= 1 << rank
+        avail_key = tuple(avail)
+        parts = [_parts(i) for i in ids]
+
+        result = []
+        for n in range(6):
+            count = comb(len(unseen), n)
+            for discard in combinations(range(5), n):
+                kept = [p for i, p in enumerate(parts) if i not in discard]
+                if self.samples is not None and count > self.samples:
+                    expected = self.__sampled(
+                        tuple(ids[i] for i in range(5) if i not in discard),
+                        unseen)
+                    result.append(Decision(discard, expected, False))
+                    continue
+                total = self.__rank_total(
+                    tuple(sorted(r for _, r in kept)), avail_key)
+                suits = {s for s, _ in kept}
+                if not kept:
+                    for mask in suit_avail:
+                        if mask.bit_count() >= 5:
+                            total += self.__flush_delta(0, mask)
+                elif len(suits) == 1:
+                    (suit,) = suits
+                    mask = suit_avail[suit]
+                    if mask.bit_count() >= n:
+                        total += self.__flush_delta(
+                            sum(1 << r for _, r in kept), mask)
+                result.append(Decision(discard, total / count, True))
+        return result
+
+    def best(self, hand: PokerHand, deck: Deck | None = None,
+             dead: Iterable[Card] = ()) -> Decision:
+        """期待値が最も大きい捨て方を選ぶ
+
+        期待値が同じなら捨てる枚数が少ないほうを選ぶ
+        引数は evaluateと同じ
+        """
+        decisions = self.evaluate(hand, deck, dead)
+        return max(decisions, key=lambda d: d.expected)
+
+    def decide(self, hands: list[PokerHand], deck: Deck | None = None, *,
+               workers: int | None = 1) -> list[Decision]:
+        """複数のプレーヤーの捨て方をまとめて選ぶ
+
+        Args:
+            hands: プレーヤーごとの 5枚の手札
+            deck: 引き直すデッキ(Noneなら各プレーヤーの手札以外のカード)
+            workers: プロセス数(Noneなら CPU数、1ならプロセスを使わない)
+
+        Returns:
+            プレーヤーごとの Decision
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1:
+            return [self.best(hand, deck) for hand in hands]
+        remaining = None if deck is None else [c.id for c in deck]
+        settings = (self.samples, self.seed, self.maxsize)
+        work = [(settings, [c.id for c in hand.cards], remaining)
+                for hand in hands]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_best_in_worker, work))
+
+    @staticmethod
+    def exchange(hand: PokerHand, deck: Deck, decision: Decision) -> None:
+        """decisionのカードを捨て、同じ枚数をデッキから引く
+        """
+        cards = hand.cards
+        # delするとインデックスがずれるので降順で後ろから削除する
+        for i in sorted(decision.discard, reverse=True):
+            del cards[i]
+        for card in deck.draw_many(len(decision.discard)):
+            hand.append(card)
+
+    def play(self, hands: list[PokerHand], deck: Deck, *,
+             workers: int | None = 1) -> list[Decision]:
+        """全員の捨て方を選び、席順にデッキから引き直す
+
+        捨て方は、各プレーヤーから見えないカード(自分の手札以外)の中から
+        引くものとして選ぶ(デッキの残りや他のプレーヤーの手札は見ない)
+
+        Returns:
+            プレーヤーごとの Decision
+        """
+        decisions = self.decide(hands, workers=workers)
+        for hand, decision in zip(hands, decisions):
+            self.exchange(hand, deck, decision)
+        return decisions
+
+
+def _code(ranks: Iterable[int]) -> int:
+    # rankの重複組み合わせを rankごとの枚数を 3ビットずつ並べた整数で表す
+    # 2つの組み合わせを合わせたものはコードの和になる
+    code = 0
+    for r in ranks:
+        code += 1 << 3 * r
+    return code
+
+
+# _CHOOSE[a][m]: a枚から m枚選ぶ組み合わせの数(m = 0..5)
+_CHOOSE = [[comb(a, m) for m in range(6)] for a in range(5)]
+# _DRAWS[n]: n枚引いたときの rankの重複組み合わせごとの
+#            ((rank, 枚数)のタプル, コード) のリスト
+_DRAWS = [[(tuple((r, drawn.count(r)) for r in sorted(set(drawn))),
+            _code(drawn))
+           for drawn in combinations_with_replacement(range(13), n)]
+          for n in range(6)]
+# 5枚の組み合わせのコードから ScoreTable.unsuitedの通し番号を引く辞書
+_CODE_INDEX = {_code(ranks): ScoreTable.index(list(ranks))
+               for ranks in combinations_with_replacement(range(13), 5)}
+
+
+def _parts(card_id: int) -> tuple[int, int]:
+    # 通し番号から (スート(0..3), rank(2 → 0, ..., K → 11, A → 12)) を得る
+    suit, number = divmod(card_id, 13)
+    return suit, 12 if number == 0 else number - 1
+
+
+# ワーカーのプロセスごとに設定ごとの ExchangeEngineを使い回す
+_engines: dict[tuple, ExchangeEngine] = {}
+
+
+def _best_in_worker(args: tuple[tuple, list[int], list[int] | None]) \
+        -> Decision:
+    # ワーカーで実行する 1人分の捨て方の選択
+    settings, ids, remaining = args
+    engine = _engines.get(settings)
+    if engine is None:
+        samples, seed, maxsize = settings
+        engine = _engines[settings] = ExchangeEngine(
+            samples=samples, seed=seed, maxsize=maxsize)
+    hand = PokerHand()
+    for i in ids:
+        hand.append(PokerCard.from_id(i))
+    dead = []
+    if remaining is not None:
+        # デッキの残り以外はすべて引けないカードとする
+        left = set(remaining) | set(ids)
+        dead = [PokerCard.from_id(i) for i in range(52) if i not in left]
+    return engine.best(hand, dead=dead)
@@ -0,0 +1,213 @@
+""" 配った手札とショーダウンの結果を固定長のバイナリ形式で記録するモジュール
+
+    ファイルの先頭はヘッダ(マジックナンバー, バージョン, レコード長)で、
+    その後に 1手札 1レコードの固定長レコードが続く
+
+    * class HandRecord: 1手札分のレコード
+    * class HistoryWriter: レコードをまとめてファイルに書き込む
+    * class HistoryReader: ファイルをメモリマップして読み出す
+
+"""
+import mmap
+import struct
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+from poker import PokerCard, PokerHand, SCORE_UNIT, score_table, showdown
+
+MAGIC = b"PKHH"
+VERSION = 1
+# ヘッダ: マジックナンバー, バージョン, レコード長
+_HEADER = struct.Struct("<4sHH")
+# レコード: ラウンド番号, 席, フラグ, カードの通し番号 7枚分, 役, 同じ役の中の強さ
+_RECORD = struct.Struct("<IBB7sBI")
+# カードが 7枚に満たないときの空き
+_EMPTY = 0xFF
+# フラグ: 勝者
+WINNER = 0x01
+
+
+class HandRecord(NamedTuple):
+    """1手札分のレコード
+
+    Attributes:
+        round: ラウンド番号
+        seat: 席番号
+        winner: ショーダウンで勝ったかどうか
+        cards: カードの通し番号(Card.id)のタプル
+        major: 役(PokerHandEnumの値)
+        minor: 同じ役の中の強さ
+
+    """
+    round: int
+    seat: int
+    winner: bool
+    cards: tuple[int, ...]
+    major: int
+    minor: int
+
+    @property
+    def score(self) -> int:
+        return self.major * SCORE_UNIT + self.minor
+
+    def to_hand(self, name: str = "") -> PokerHand:
+        """レコードから PokerHandを作る
+        """
+        hand = PokerHand(name)
+        for i in self.cards:
+            hand.append(PokerCard.from_id(i))
+        return hand
+
+
+class HistoryWriter:
+    """レコードをまとめてファイルに書き込む
+
+    レコードはバッファにためておき、buffer_records件たまるか
+    flush / closeしたときにまとめて書き込む
+    with文で使える
+    """
+    def __init__(self, file: str | BinaryIO, *,
+                 buffer_records: int = 4096) -> None:
+        if isinstance(file, str):
+            self.__file = open(file, "wb")
+            self.__owns = True
+        else:
+            self.__file = file
+            self.__owns = False
+        self.__file.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size))
+        self.__buffer = bytearray(_RECORD.size * buffer_records)
+        self.__capacity = buffer_records
+        self.__count = 0
+        self.__closed = False
+
+    def __enter__(self) -> "HistoryWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, round: int, seat: int, hand: PokerHand,
+              winner: bool = False) -> None:
+        """手札 1つ分のレコードを書き込む
+
+        Raises:
+            ValueError: カードが 8枚以上、またはジョーカー入り
+        """
+        ids = bytes(c.id for c in hand.cards)
+        if len(ids) > 7 or any(i >= 52 for i in ids):
+            raise ValueError("a record holds up to 7 cards without jokers")
+        score = hand.score
+        _RECORD.pack_into(self.__buffer, self.__count * _RECORD.size,
+                          round, seat, WINNER if winner else 0,
+                          ids.ljust(7, bytes([_EMPTY])),
+                          score // SCORE_UNIT, score % SCORE_UNIT)
+        self.__count += 1
+        if self.__count == self.__capacity:
+            self.flush()
+
+    def write_showdown(self, round: int, hands: Iterable[PokerHand]) -> None:
+        """1ラウンド分の手札を、勝者のフラグを付けて席順に書き込む
+        """
+        hands = list(hands)
+        winners = {id(h) for h in showdown(hands)}
+        for seat, hand in enumerate(hands):
+            self.write(round, seat, hand, id(hand) in winners)
+
+    def flush(self) -> None:
+        """バッファにたまったレコードを書き込む
+        """
+        if self.__count:
+            self.__file.write(
+                memoryview(self.__buffer)[:self.__count * _RECORD.size])
+            self.__count = 0
+        self.__file.flush()
+
+    def close(self) -> None:
+        """バッファを書き込んでファイルを閉じる
+
+        2回目以降は何もしない
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.flush()
+        if self.__owns:
+            self.__file.close()
+
+
+class HistoryReader:
+    """ファイルをメモリマップして読み出す
+
+    ファイル全体を読み込まずに、レコードを 1件ずつ取り出せる
+    with文で使える
+
+    Raises:
+        ValueError: ファイルの形式・バージョンが違う
+    """
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.__map) < _HEADER.size:
+            self.__map.close()
+            raise ValueError(f"not a version {VERSION} hand history: {path}")
+        magic, version, size = _HEADER.unpack_from(self.__map)
+        if magic != MAGIC or version != VERSION or size != _RECORD.size:
+            self.__map.close()
+            raise ValueError(f"not a version {VERSION} hand history: {path}")
+        body = len(self.__map) - _HEADER.size
+        if body % _RECORD.size:
+            self.__map.close()
+            raise ValueError(f"truncated hand history: {path}")
+        self.__len = body // _RECORD.size
+
+    def __enter__(self) -> "HistoryReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.__len
+
+    @staticmethod
+    def __record(fields: tuple) -> HandRecord:
+        round, seat, flags, cards, major, minor = fields
+        return HandRecord(round, seat, bool(flags & WINNER),
+                          tuple(i for i in cards if i != _EMPTY),
+                          major, minor)
+
+    def __getitem__(self, index: int) -> HandRecord:
+        if index < 0:
+            index += self.__len
+        if not 0 <= index < self.__len:
+            raise IndexError("record index out of range")
+        return self.__record(_RECORD.unpack_from(
+            self.__map, _HEADER.size + index * _RECORD.size))
+
+    def __iter__(self) -> Iterator[HandRecord]:
+        # memoryviewを作ると途中で closeできなくなるので、1件ずつ読む
+        m = self.__map
+        for offset in range(_HEADER.size,
+                            _HEADER.size + self.__len * _RECORD.size,
+                            _RECORD.size):
+            yield self.__record(_RECORD.unpack_from(m, offset))
+
+    def rescore(self) -> Iterator[tuple[HandRecord, int]]:
+        """レコードの手札を評価し直して (レコード, 評価値) を返す
+
+        PokerHandを作らずに通し番号のまま評価するので、評価方法を
+        変えたあとで記録済みの評価値と比べるときなどに使う
+        """
+        table = score_table()
+        for record in self:
+            if len(record.cards) == 5:
+                score = table.lookup_ids(record.cards)
+            elif len(record.cards) > 5:
+                score, _ = table.best_ids(list(record.cards))
+            else:
+                score = record.to_hand().score
+            yield record, score
+
+    def close(self) -> None:
+        """メモリマップを閉じる
+        """
+        self.__map.close()
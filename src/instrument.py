@@ -0,0 +1,161 @@
+""" ポーカーの手札の評価にかかる時間を段階ごとに測るモジュール
+
+    有効にしている間だけ PokerHand・ScoreTable・Cardのメソッドを
+    計測用のラッパーに差し替え、無効にすると元のメソッドに戻す
+    無効のときは何も差し替えないので、通常の処理に余分な負荷はかからない
+
+    * class Profiler: 段階ごとの呼び出し回数・累積時間と役ごとの回数を集める
+
+    使用例:
+        with Profiler() as profiler:
+            hand.evaluate()
+        print(profiler.snapshot())
+
+"""
+import time
+from collections import Counter
+from functools import wraps
+from typing import Any, Callable
+
+from card import Card
+from poker import Evaluator, PokerHand, ScoreTable
+
+# 段階名と差し替えるメソッド
+# 時間は呼び出し先も含めた累積なので、evaluateの時間は他の段階の時間を含む
+_METHODS: list[tuple[str, type, str]] = [
+    ("evaluate", PokerHand, "_PokerHand__evaluate_uncached"),
+    ("evaluate_best", PokerHand, "evaluate_best"),
+    ("chain", PokerHand, "_PokerHand__evaluate_by_chain"),
+    ("pre_evaluate", PokerHand, "_PokerHand__pre_evaluate"),
+    ("table_lookup", ScoreTable, "lookup"),
+    ("table_best", ScoreTable, "best_ids"),
+    ("hand_compare", PokerHand, "__gt__"),
+    ("hand_compare", PokerHand, "__eq__"),
+] + [("card_compare", Card, name)
+     for name in ("__eq__", "__lt__", "__le__", "__gt__", "__ge__")]
+
+# 有効になっている Profiler(同時に有効にできるのは 1つだけ)
+_active: "Profiler | None" = None
+
+
+class Profiler:
+    """段階ごとの呼び出し回数・累積時間と役ごとの回数を集める
+
+    enable / disableで計測の開始・終了を切り替える
+    with文で使うと、ブロックの間だけ計測する
+
+    Attributes:
+        calls: 段階名ごとの呼び出し回数
+        nanoseconds: 段階名ごとの累積時間(ナノ秒)
+        categories: キャッシュを使わずに評価した手札の役名ごとの回数
+
+    """
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.nanoseconds: Counter[str] = Counter()
+        self.categories: Counter[str] = Counter()
+        self.__restore: list[Callable[[], None]] = []
+
+    def __enter__(self) -> "Profiler":
+        self.enable()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.disable()
+
+    @property
+    def enabled(self) -> bool:
+        return _active is self
+
+    def __timed(self, stage: str, func: Callable) -> Callable:
+        # 呼び出し回数と時間を stageに加えるラッパーを作る
+        calls, nanoseconds = self.calls, self.nanoseconds
+        clock = time.perf_counter_ns
+
+        @wraps(func)
+        def _timed(*args, **kwargs) -> Any:
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                nanoseconds[stage] += clock() - start
+                calls[stage] += 1
+        return _timed
+
+    def __counted(self, func: Callable) -> Callable:
+        # 評価結果の役名を数えるラッパーを作る
+        categories = self.categories
+
+        @wraps(func)
+        def _counted(*args) -> tuple:
+            result = func(*args)
+            categories[result[-1]] += 1
+            return result
+        return _counted
+
+    def __patch(self, owner: type, attr: str, func: Callable) -> None:
+        original = owner.__dict__[attr]
+        setattr(owner, attr, func)
+        self.__restore.append(lambda: setattr(owner, attr, original))
+
+    def enable(self) -> None:
+        """計測を始める
+
+        Raises:
+            RuntimeError: 別の Profilerが有効になっている
+        """
+        global _active
+        if _active is self:
+            return
+        if _active is not None:
+            raise RuntimeError("another profiler is already enabled")
+        _active = self
+        for stage, owner, attr in _METHODS:
+            func = self.__timed(stage, owner.__dict__[attr])
+            if stage == "evaluate":
+                func = self.__counted(func)
+            self.__patch(owner, attr, func)
+
+        # 判定器は __EVALUATORSのリストが関数を直接持っているので
+        # リストの要素を差し替える
+        evaluators = PokerHand._PokerHand__EVALUATORS
+        originals = list(evaluators)
+        for i, e in enumerate(originals):
+            evaluators[i] = Evaluator(
+                self.__timed("tester:" + e.name, e.tester), e.major,
+                self.__timed("calc_minor", e.minor), e.name)
+        self.__restore.append(
+            lambda: evaluators.__setitem__(slice(None), originals))
+
+    def disable(self) -> None:
+        """計測をやめて元のメソッドに戻す
+
+        集めた値はそのまま残る
+        """
+        global _active
+        if _active is not self:
+            return
+        while self.__restore:
+            self.__restore.pop()()
+        _active = None
+
+    def reset(self) -> None:
+        """集めた値を消す
+        """
+        self.calls.clear()
+        self.nanoseconds.clear()
+        self.categories.clear()
+
+    def snapshot(self) -> dict[str, dict]:
+        """集めた値を JSONに変換できる辞書で返す
+
+        Returns:
+            {"stages": {段階名: {"calls": 回数, "seconds": 累積時間}},
+             "categories": {役名: 回数}}
+        """
+        return {
+            "stages": {stage: {"calls": self.calls[stage],
+                               "seconds": self.nanoseconds[stage] / 1e9}
+                       for stage in sorted(self.calls)},
+            "categories": dict(self.categories.most_common()),
+        }
@@ -1,8 +1,28 @@
 from enum import IntEnum, auto
-from collections import Counter
+from array import array
+from collections import Counter, OrderedDict
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from itertools import combinations, combinations_with_replacement
+from math import comb
 # from functools import reduce
-from typing import TypeVar, Callable, NamedTuple, Any
-from card import Card, Hand
+from typing import TypeVar, Callable, NamedTuple, Any, Iterable, Sequence
+from card import BitHand, Card, Suit
+
+
+# 評価値 = 役(major) * SCORE_UNIT + 同じ役の中の強さ(minor)
+SCORE_UNIT = 1_00_00_00_00_00
+# A-2-3-4-5(ホイール)と 10-J-Q-K-Aの番号のビット(BitHand.rank_mask)
+_WHEEL = 0b1_1111
+_ROYAL = 0b1_1110_0000_0001
+# ホイールの同じ役の中の強さ(5-4-3-2-A、Aを 1として扱う)
+WHEEL_MINOR = 5_04_03_02_01
+# ストレートになる 5つの番号のビット(A-2-3-4-5 ~ 10-J-Q-K-A)
+_STRAIGHTS = [_WHEEL << r for r in range(9)] + [_ROYAL]
 
 
 class PokerCard(Card):
@@ -16,12 +36,16 @@ class PokerCard(Card):
         strength: カードの強さ
 
     """
-    @property
-    def strength(self) -> int:
+    __slots__ = ()
+
+    @staticmethod
+    def _strength_of(suit: Suit, number: int) -> int:
         # ポーカー固有のカードの強さ
         # Aが最強(14)、以下 K, Q, J, 10 ... 2
-        # スートは無視する
-        return 14 if self.number == 1 else self.number
+        # スートは無視する(ジョーカーは 0)
+        if suit == Suit.JOKER:
+            return 0
+        return 14 if number == 1 else number
 
 
 class PokerHandEnum(IntEnum):
@@ -40,6 +64,8 @@ class PokerHandEnum(IntEnum):
     FOUR_OF_A_KIND = auto()
     STRAIGHT_FLUSH = auto()
     ROYAL_STRAIGHT_FLUSH = auto()
+    # ジョーカーを使ったときだけできる役
+    FIVE_OF_A_KIND = auto()
 
 
 class Evaluator(NamedTuple):
@@ -60,17 +86,115 @@ class Evaluator(NamedTuple):
     name: str
 
 
-class PokerHand(Hand):
+class CacheStats:
+    """評価結果のキャッシュのヒット数・ミス数
+
+    ベンチマークなどで参照するために使う
+
+    Attributes:
+        hits: キャッシュから評価結果を返した回数
+        misses: 手札を評価した回数
+
+    """
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"CacheStats(hits={self.hits}, misses={self.misses})"
+
+    def reset(self) -> None:
+        """カウンタを 0に戻す
+        """
+        self.hits = 0
+        self.misses = 0
+
+
+class ScoreCache:
+    """手札の構成(BitHand.canonical_key)から評価値を引く LRUキャッシュ
+
+    スートの入れ替えで移り合う手札は評価値が同じなので 1つの項目を共有する
+    maxsizeを超えたら最も長く使われていない項目を捨てる
+
+    Attributes:
+        maxsize: 保存する項目の最大数(0ならキャッシュしない)
+        hits: キャッシュから評価値を返した回数
+        misses: キャッシュになかった回数
+        evictions: maxsizeを超えて捨てた項目の数
+
+    """
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__items: OrderedDict[tuple[int, ...], int] = OrderedDict()
+
+    def __repr__(self) -> str:
+        return (f"ScoreCache(maxsize={self.maxsize}, size={len(self)}, "
+                f"hits={self.hits}, misses={self.misses}, "
+                f"evictions={self.evictions})")
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def get(self, key: tuple[int, ...]) -> int | None:
+        """キーの評価値を返す(ない場合は None)
+        """
+        score = self.__items.get(key)
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.__items.move_to_end(key)
+        return score
+
+    def put(self, key: tuple[int, ...], score: int) -> None:
+        """キーの評価値を保存する
+        """
+        items = self.__items
+        items[key] = score
+        items.move_to_end(key)
+        while len(items) > self.maxsize:
+            items.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """保存した項目とカウンタを消す
+        """
+        self.__items.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class PokerHand(BitHand):
     """ポーカー専用の手札
 
     比較により手札同士の強弱を判定可能
+    評価結果は手札が変わるまでキャッシュする
+    ハッシュ値は手札のカードから求めるので、同点の手札でもカードが違えば
+    集合や辞書で区別できる(入れている間は手札を変えないこと)
+
+    Attributes:
+        cache_stats: 全ての PokerHandで共有するキャッシュの統計
+        score_cache: 表を 1回引くだけでは評価できない手札(5枚以外・
+                     ジョーカー入り)の評価値を構成ごとに保存するキャッシュ
+        category: 今の手札で成立している最も強い役(評価せずに求める)
+
     """
     Self = TypeVar('Self', bound='PokerHand')
 
+    cache_stats = CacheStats()
+    score_cache = ScoreCache()
+
     def __init__(self, *args):
         super().__init__(*args)
         self.major: int
         self.minor: int
+        # _cached: (評価値, 役, 同じ役の中の強さ, 役名)
+        # 手札が変わると Handが Noneに戻す
+        self._cached: tuple[int, int, int, str] | None
 
     # デコレータ
     @staticmethod
@@ -88,11 +212,18 @@ class PokerHand(Hand):
 
     @comparator
     def __gt__(self: Self, other: Self) -> bool:
-        return self.__score > other.__score
+        return self.score > other.score
 
-    @comparator
-    def __eq__(self: Self, other: Self) -> bool:
-        return self.__score == other.__score
+    def __eq__(self: Self, other: object) -> bool:
+        # PokerHand以外と比べたときは相手に任せる(== では Falseになる)
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return self.score == other.score
+
+    def __hash__(self) -> int:
+        # 手札のカード(通し番号のビットとジョーカーの枚数)から求める
+        # 同点でもカードが違う手札は別のハッシュ値になる
+        return hash((self.mask, self.jokers))
 
     def sort(self) -> None:
         """カードを並べ替える
@@ -110,23 +241,18 @@ class PokerHand(Hand):
         # これにより枚数が多いカードが先に、番号が小さいものが先に並ぶ
         ordered_tuple.sort(key=lambda t: (t[0], 14 - t[1].number),
                            reverse=True)
-        # 親クラスのカードリストを置き換える
-        # 本来 privateなので直接操作できないが難読化した名前でアクセスしている
-        self._Hand__cards = [t[1] for t in ordered_tuple]
+        # 親クラスのカードリストの中身を置き換える
+        self.cards[:] = [t[1] for t in ordered_tuple]
 
     def __pre_evaluate(self) -> None:
         # 同じ番号の手札を数える
         # __c: (枚数, カードの強さ)の順に降順に並べたリスト
         # __g: 枚数だけを降順に並べたリスト、ペア系の役の判定に使う
-        # __an: 最も弱い強さが 0になるよう調整したリスト(adjusted number)
-        nums = [card.strength for card in self.cards]
-        self.__c = sorted(Counter(nums).most_common(),
+        #      BitHandのビットマスクから求める
+        self.__c = sorted(Counter(self.nums).most_common(),
                           key=lambda t: (t[1], t[0]),
                           reverse=True)
-        self.__g = list(Counter(nums).values())
-        self.__g.sort(reverse=True)
-        nums.sort()
-        self.__an = [x - min(nums) for x in nums]
+        self.__g = self.groups
 
     def __calc_minor(self) -> int:
         # 手札が同じ役の時の強弱を計算する
@@ -155,17 +281,33 @@ class PokerHand(Hand):
         return self.__g == [4, 1]
 
     def __is_flush(self) -> bool:
-        return len(self.suits) == 1
+        # 一番下のビットと一番上のビットが同じスートの 13ビットに入っている
+        m = self.mask
+        return m != 0 and self.jokers == 0 \
+            and ((m & -m).bit_length() - 1) // 13 == (m.bit_length() - 1) // 13
 
     def __is_straight(self) -> bool:
-        return self.__an == [0, 1, 2, 3, 4]
+        # Aを最上位に移した番号のビットが 5つ連続している
+        # または A-2-3-4-5(ホイール)で番号のビットの下位 5つが立っている
+        r = self.rank_mask
+        hi = (r >> 1) | ((r & 1) << 12)
+        return len(self.cards) == 5 and self.jokers == 0 \
+            and (hi == (hi & -hi) * 0b11111 or r == _WHEEL)
 
     def __is_straightflush(self) -> bool:
         return self.__is_flush() and self.__is_straight()
 
     def __is_royalstraightflush(self) -> bool:
-        # 枚数、番号(強さ)順に並べたリストの番号が Aだったら
-        return self.__c[0][0] == 14 and self.__is_straightflush()
+        # 番号が 10-J-Q-K-Aのストレートフラッシュ
+        # (A-2-3-4-5のストレートフラッシュは含まない)
+        return self.rank_mask == _ROYAL and self.__is_straightflush()
+
+    def __calc_straight_minor(self) -> int:
+        # ストレートの強弱を計算する
+        # ホイールでは Aを 1として扱い、5が最も強いカードになる
+        if self.rank_mask == _WHEEL:
+            return WHEEL_MINOR
+        return self.__calc_minor()
 
     # ------------------------------------------------------------
     # 役の評価
@@ -178,7 +320,7 @@ class PokerHand(Hand):
                   "Royal straight flush"),
         Evaluator(__is_straightflush,
                   lambda _: PokerHandEnum.STRAIGHT_FLUSH,
-                  __calc_minor,
+                  __calc_straight_minor,
                   "Straight flush"),
         Evaluator(__is_fourcards,
                   lambda _: PokerHandEnum.FOUR_OF_A_KIND,
@@ -194,7 +336,7 @@ class PokerHand(Hand):
                   "Flush"),
         Evaluator(__is_straight,
                   lambda _: PokerHandEnum.STRAIGHT,
-                  __calc_minor,
+                  __calc_straight_minor,
                   "Straight"),
         Evaluator(__is_threecards,
                   lambda _: PokerHandEnum.THREE_OF_A_KIND,
@@ -218,18 +360,98 @@ class PokerHand(Hand):
     def evaluate(self) -> str:
         """手札を評価する
 
+            5枚以上の手札は ScoreTableを引いて評価する
+            ジョーカーは最も強くなるカードの代わりにする
+            5枚未満の手札は判定器を順に適用する
+
             Returns:
                 役の文字列
         """
+        cached = self._cached
+        if cached is None:
+            PokerHand.cache_stats.misses += 1
+            cached = self._cached = self.__evaluate_uncached()
+        else:
+            PokerHand.cache_stats.hits += 1
+        _, self.major, self.minor, name = cached
+        return name
+
+    def __evaluate_uncached(self) -> tuple[int, int, int, str]:
+        # 手札を評価して (評価値, 役, 同じ役の中の強さ, 役名) を返す
+        cards = self.cards
+        if len(cards) == 5:
+            # ジョーカー入りの手札は表にないので 0になる
+            score = score_table().lookup(cards)
+            if score:
+                return self.__result(score)
+        # 表を 1回引くだけでは評価できない手札は構成ごとにキャッシュする
+        # (キーはスートを区別しないので PokerCardの手札に限る)
+        cache = PokerHand.score_cache
+        use_cache = cache.maxsize > 0 \
+            and all(c.__class__ is PokerCard for c in cards)
+        if use_cache:
+            key = self.canonical_key
+            score = cache.get(key)
+            if score is not None:
+                return self.__result(score)
+        if len(cards) >= 5:
+            # 6枚以上の手札は最も強い 5枚の組み合わせで評価する
+            # ジョーカーは最も強くなるカードの代わりにする
+            score, _ = score_table().best_ids([c.id for c in cards])
+            result = self.__result(score)
+        else:
+            major, minor, name = self.__evaluate_by_chain()
+            result = major * SCORE_UNIT + minor, major, minor, name
+        if use_cache:
+            cache.put(key, result[0])
+        return result
+
+    @staticmethod
+    def __result(score: int) -> tuple[int, int, int, str]:
+        # 評価値から (評価値, 役, 同じ役の中の強さ, 役名) を作る
+        major, minor = divmod(score, SCORE_UNIT)
+        major = PokerHandEnum(major)
+        return score, major, minor, HAND_NAMES[major]
+
+    def evaluate_best(self) -> tuple[str, list[Card]]:
+        """手札から最も強い 5枚を選んで評価する
+
+            テキサスホールデムの 7枚(手札 2枚 + 場札 5枚)などで使う
+            5枚の組み合わせは通し番号のまま表を引くので
+            組み合わせごとの PokerHandは作らない
+
+            ジョーカーは最も強くなるカードの代わりにする
+
+            Returns:
+                (役の文字列, 選んだ 5枚のカード)
+
+            Raises:
+                ValueError: 5枚未満の手札
+        """
+        cards = self.cards
+        if len(cards) < 5:
+            raise ValueError("needs at least 5 cards")
+        score, ids = score_table().best_ids([c.id for c in cards])
+        chosen = list(ids)
+        best = []
+        for c in cards:
+            if c.id in chosen:
+                chosen.remove(c.id)
+                best.append(c)
+        major, self.minor = divmod(score, SCORE_UNIT)
+        self.major = PokerHandEnum(major)
+        return HAND_NAMES[self.major], best
+
+    def __evaluate_by_chain(self) -> tuple[int, int, str]:
+        # 判定器を優先度順に適用して (役, 同じ役の中の強さ, 役名) を返す
+        # ScoreTableの作成にも使う
         self.__pre_evaluate()
 
         for e in PokerHand.__EVALUATORS:
             if e.tester(self):
-                self.major = e.major(self)
-                self.minor = e.minor(self)
-                return e.name
+                return e.major(self), e.minor(self), e.name
 
-        return "Can't evaluate."
+        return 0, 0, "Can't evaluate."
 
         """旧実装
         if self.is_royalstraightflush():
@@ -265,6 +487,425 @@ class PokerHand(Hand):
         """
 
     @property
-    def __score(self) -> int:
-        self.evaluate()
-        return self.major * 1_00_00_00_00_00 + self.minor
+    def score(self) -> int:
+        """手札の評価値(役 * SCORE_UNIT + 同じ役の中の強さ)
+
+        大きいほど強い手札になる
+        """
+        if self._cached is None:
+            self.evaluate()
+        else:
+            PokerHand.cache_stats.hits += 1
+        return self._cached[0]
+
+    @property
+    def category(self) -> PokerHandEnum:
+        """今の手札で成立している最も強い役
+
+        カードを 1枚ずつ配っている途中や、交換するカードを試しているときに
+        評価し直さずに手札の強さを調べるために使う
+        BitHandのビットマスクだけから求めるので、手札の枚数によらず
+        一定の時間で求まる(ビットマスクは 1枚の追加・削除ごとに更新される)
+        5枚以上の手札では evaluate(6枚以上では最も強い 5枚)の役と一致する
+        5枚未満の手札では、その枚数で成立している役(フォーカードなど)を返す
+        ジョーカーは最も強い役になるカードの代わりにする
+        """
+        jokers = self.jokers
+        pairs = self.kinds(2)
+        most = 4 if self.kinds(4) else 3 if self.kinds(3) \
+            else 2 if pairs else 1 if self.kinds(1) else 0
+        most += jokers
+        if most >= 5:
+            return PokerHandEnum.FIVE_OF_A_KIND
+        # スートごとの番号のビットのうち 5 - ジョーカー枚数 以上あるもの
+        flushes = [m for m in (self.suit_mask(s) for s in _SUITS)
+                   if m.bit_count() + jokers >= 5]
+        for m in flushes:
+            if (m & _ROYAL).bit_count() + jokers >= 5:
+                return PokerHandEnum.ROYAL_STRAIGHT_FLUSH
+        for m in flushes:
+            if any((m & w).bit_count() + jokers >= 5 for w in _STRAIGHTS):
+                return PokerHandEnum.STRAIGHT_FLUSH
+        if most >= 4:
+            return PokerHandEnum.FOUR_OF_A_KIND
+        two_pairs = pairs.bit_count() >= 2
+        if two_pairs and (jokers or self.kinds(3)):
+            return PokerHandEnum.FULL_HOUSE
+        if flushes:
+            return PokerHandEnum.FLUSH
+        ranks = self.rank_mask
+        if any((ranks & w).bit_count() + jokers >= 5 for w in _STRAIGHTS):
+            return PokerHandEnum.STRAIGHT
+        if most >= 3:
+            return PokerHandEnum.THREE_OF_A_KIND
+        if two_pairs:
+            return PokerHandEnum.TWO_PAIR
+        if most >= 2:
+            return PokerHandEnum.ONE_PAIR
+        return PokerHandEnum.NO_PAIR
+
+
+# ジョーカー以外のスート
+_SUITS = (Suit.CLUB, Suit.DIAMOND, Suit.HEART, Suit.SPADE)
+
+
+def showdown(hands: Iterable[PokerHand]) -> list[PokerHand]:
+    """最も強い手札を選ぶ
+
+    各手札は 1回だけ評価し、評価値を 1度ずつ比べる
+
+    Returns:
+        最も強い手札のリスト(引き分けなら複数、席順のまま)
+    """
+    best = -1
+    winners: list[PokerHand] = []
+    for hand in hands:
+        score = hand.score
+        if score > best:
+            best = score
+            winners = [hand]
+        elif score == best:
+            winners.append(hand)
+    return winners
+
+
+def split_pot(pot: int, hands: list[PokerHand]) -> list[int]:
+    """ポットを勝者で分ける
+
+    割り切れない端数は席順で前の勝者から 1ずつ配る
+
+    Returns:
+        handsと同じ順に並べた各プレーヤーの取り分
+
+    Raises:
+        ValueError: 手札が 1つもない(ポットを受け取る人がいない)
+    """
+    if not hands:
+        raise ValueError("cannot split a pot among no hands")
+    winners = {id(h) for h in showdown(hands)}
+    share, odd = divmod(pot, len(winners))
+    result = []
+    for hand in hands:
+        if id(hand) in winners:
+            result.append(share + (odd > 0))
+            odd -= 1
+        else:
+            result.append(0)
+    return result
+
+
+def ranking(hands: Iterable[PokerHand]) -> list[list[PokerHand]]:
+    """すべての手札を強い順に並べる(結果の表示用)
+
+    各手札は 1回だけ評価する
+
+    Returns:
+        同じ強さの手札をまとめたリストを強い順に並べたリスト
+    """
+    scored = sorted(((hand.score, i, hand) for i, hand in enumerate(hands)),
+                    key=lambda t: (-t[0], t[1]))
+    result: list[list[PokerHand]] = []
+    last = None
+    for score, _, hand in scored:
+        if score != last:
+            result.append([])
+            last = score
+        result[-1].append(hand)
+    return result
+
+
+# 役から役名を引く辞書(判定器の役名をそのまま使う)
+HAND_NAMES: dict[int, str] = {
+    e.major(None): e.name for e in PokerHand._PokerHand__EVALUATORS
+}
+# 5枚同じ番号はジョーカーを使ったときだけできるので判定器にはない
+HAND_NAMES[PokerHandEnum.FIVE_OF_A_KIND] = "Five of a kind"
+
+
+# 通し番号(Card.id)から rank(ポーカーの強さ - 2)を引く表
+_ID_RANKS = [12 if i % 13 == 0 else i % 13 - 1 for i in range(52)]
+# ストレートになる rankのビット(A-2-3-4-5を含む)
+_STRAIGHT_MASKS = [0b11111 << r for r in range(9)] + [0b1111 | 1 << 12]
+
+
+class ScoreTable:
+    """5枚の手札の評価値を引くための表
+
+    評価値は PokerHand.evaluateの判定器で計算したものと同じになる
+    強さ(2..14)から 2を引いた値を番号(rank: 0..12)として
+        * flush: 5枚とも同じスートの手札 rankのビットマスクで引く(2**13通り)
+        * unsuited: それ以外の手札 rankの重複組み合わせの通し番号で引く
+    表にない組み合わせ(5枚でない、ジョーカー入りなど)は 0になる
+    ジョーカー入りの手札は lookup_wildで評価する
+
+    saveでファイルに書き出し、loadでメモリマップして読み込める
+    ファイルにはバージョンと役の定義から作ったフィンガープリント、
+    内容のチェックサムを入れておき、古いファイルや壊れたファイルを検出する
+    判定器の結果が変わるような修正をしたら VERSIONを上げること
+
+    Attributes:
+        flush: フラッシュ用の評価値の配列
+        unsuited: フラッシュ以外の評価値の配列
+
+    """
+    # 2: A-2-3-4-5をストレートとして扱うようにした
+    # 3: 5枚同じ番号(ファイブカード)の評価値を入れた
+    VERSION = 3
+    # ファイルのヘッダ: マジックナンバー, バージョン, フィンガープリント,
+    #                   flushの要素数, unsuitedの要素数, チェックサム
+    __MAGIC = b"PKST"
+    __HEADER = struct.Struct("<4sIIIII")
+
+    # 重複組み合わせの通し番号の計算に使う重み
+    # 昇順に並べた rank r0 <= r1 <= ... <= r4 の通し番号は
+    # 狭義単調増加列 r_k + k の組合せ数体系 sum(C(r_k + k, k + 1)) になる
+    __WEIGHTS = [[comb(r + k, k + 1) for r in range(13)] for k in range(5)]
+    UNSUITED_SIZE = comb(13 + 5 - 1, 5)
+    FLUSH_SIZE = 1 << 13
+
+    def __init__(self, flush: Sequence[int], unsuited: Sequence[int]) \
+            -> None:
+        self.flush = flush
+        self.unsuited = unsuited
+        # loadしたときのメモリマップ(参照を保つために持っておく)
+        self.__map: mmap.mmap | None = None
+
+    @classmethod
+    def fingerprint(cls) -> int:
+        """表の作り方を表す値(バージョン・役の定義・バイトオーダー)
+        """
+        rules = repr((cls.VERSION, sys.byteorder,
+                      sorted(HAND_NAMES.items()),
+                      [(e.name, e.value) for e in PokerHandEnum]))
+        return zlib.crc32(rules.encode())
+
+    def save(self, path: str) -> None:
+        """表をファイルに書き出す
+
+        書き込み中のファイルを他のプロセスが読まないよう、
+        一時ファイルに書いてから置き換える
+        """
+        payload = bytes(self.flush) + bytes(self.unsuited)
+        header = self.__HEADER.pack(
+            self.__MAGIC, self.VERSION, self.fingerprint(),
+            len(self.flush), len(self.unsuited), zlib.crc32(payload))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ScoreTable":
+        """ファイルをメモリマップして表を読み込む
+
+        同じファイルを読み込んだプロセス同士はメモリを共有する
+
+        Raises:
+            OSError: ファイルが読めない
+            ValueError: 形式・バージョン・チェックサムが合わない
+        """
+        with open(path, "rb") as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = cls.__HEADER.size
+        try:
+            if len(m) < size:
+                raise ValueError(f"not a score table: {path}")
+            magic, version, fingerprint, n_flush, n_unsuited, checksum = \
+                cls.__HEADER.unpack_from(m)
+            if magic != cls.__MAGIC or version != cls.VERSION \
+                    or fingerprint != cls.fingerprint() \
+                    or n_flush != cls.FLUSH_SIZE \
+                    or n_unsuited != cls.UNSUITED_SIZE \
+                    or len(m) != size + 8 * (n_flush + n_unsuited):
+                raise ValueError(f"stale or mismatched score table: {path}")
+            if zlib.crc32(memoryview(m)[size:]) != checksum:
+                raise ValueError(f"corrupted score table: {path}")
+        except ValueError:
+            m.close()
+            raise
+        view = memoryview(m)
+        table = cls(view[size:size + 8 * n_flush].cast('q'),
+                    view[size + 8 * n_flush:].cast('q'))
+        table.__map = m
+        return table
+
+    @classmethod
+    def index(cls, ranks: list[int]) -> int:
+        """昇順に並べた 5つの rankから unsuitedの添字を計算する
+        """
+        w = cls.__WEIGHTS
+        return (w[0][ranks[0]] + w[1][ranks[1]] + w[2][ranks[2]]
+                + w[3][ranks[3]] + w[4][ranks[4]])
+
+    def lookup(self, cards: list[Card]) -> int:
+        """手札の評価値を表から引く
+
+        Returns:
+            評価値(表にない手札は 0)
+        """
+        if len(cards) != 5:
+            return 0
+        ranks = sorted([c._strength - 2 for c in cards])
+        if ranks[0] < 0 or ranks[4] > 12:
+            return 0
+        if len({c.suit for c in cards}) == 1:
+            mask = 0
+            for r in ranks:
+                mask |= 1 << r
+            return self.flush[mask]
+        return self.unsuited[self.index(ranks)]
+
+    def lookup_ids(self, ids: Sequence[int]) -> int:
+        """5枚のカードの通し番号(Card.id)から評価値を引く
+
+        PokerCardを作らずに評価するときに使う(ジョーカーは含められない)
+        """
+        rank = _ID_RANKS
+        ranks = sorted([rank[i] for i in ids])
+        suit = ids[0] // 13
+        if ids[1] // 13 == suit and ids[2] // 13 == suit \
+                and ids[3] // 13 == suit and ids[4] // 13 == suit:
+            return self.flush[(1 << ranks[0]) | (1 << ranks[1])
+                              | (1 << ranks[2]) | (1 << ranks[3])
+                              | (1 << ranks[4])]
+        return self.unsuited[self.index(ranks)]
+
+    def lookup_wild(self, ids: Sequence[int]) -> int:
+        """ジョーカー(通し番号 52以上)を含む 5枚のカードの評価値を引く
+
+        ジョーカーは最も強くなるカードの代わりにする
+        52枚を 1枚ずつ当てはめる代わりに、役を作る可能性のある番号
+        (手札にある番号、ストレートの穴、手札にない最も強い番号)だけを試す
+        ジョーカーがなければ lookup_idsと同じ
+        """
+        naturals = [i for i in ids if i < 52]
+        wild = 5 - len(naturals)
+        if not wild:
+            return self.lookup_ids(ids)
+        rank = _ID_RANKS
+        ranks = [rank[i] for i in naturals]
+        mask = 0
+        for r in ranks:
+            mask |= 1 << r
+        candidates = set(ranks)
+        suited = False
+        if mask.bit_count() == len(ranks):
+            # 番号がすべて異なればストレートとフラッシュを作れる
+            suited = len({i // 13 for i in naturals}) <= 1
+            for window in _STRAIGHT_MASKS:
+                if not mask & ~window:
+                    candidates.update(r for r in range(13)
+                                      if (window & ~mask) >> r & 1)
+            candidates.update([r for r in range(12, -1, -1)
+                               if not mask >> r & 1][:wild])
+
+        flush, unsuited, index = self.flush, self.unsuited, self.index
+        best = 0
+        for extra in combinations_with_replacement(sorted(candidates), wild):
+            hand = sorted(ranks + list(extra))
+            if suited and len(set(hand)) == 5:
+                m = 0
+                for r in hand:
+                    m |= 1 << r
+                score = flush[m]
+            else:
+                score = unsuited[index(hand)]
+            if score > best:
+                best = score
+        return best
+
+    def best_ids(self, ids: list[int]) -> tuple[int, tuple[int, ...]]:
+        """5枚以上のカードの通し番号から最も強い 5枚の組み合わせを探す
+
+        ジョーカー(通し番号 52以上)を含んでいてもよい
+
+        Returns:
+            (評価値, 選んだ 5枚の通し番号)
+        """
+        lookup = self.lookup_wild if max(ids) >= 52 else self.lookup_ids
+        best = -1
+        chosen: tuple[int, ...] = ()
+        for combo in combinations(ids, 5):
+            score = lookup(combo)
+            if score > best:
+                best, chosen = score, combo
+        return best, chosen
+
+    @classmethod
+    def build(cls) -> "ScoreTable":
+        """判定器で全ての rankの組み合わせを評価して表を作る
+        """
+        flush = array('q', bytes(8 * cls.FLUSH_SIZE))
+        unsuited = array('q', bytes(8 * cls.UNSUITED_SIZE))
+        suits = [Suit.CLUB, Suit.DIAMOND, Suit.HEART, Suit.SPADE]
+        for ranks in combinations_with_replacement(range(13), 5):
+            if ranks[0] == ranks[4]:
+                # 5枚同じ番号はジョーカーを使ったときだけできる
+                unsuited[cls.index(list(ranks))] = \
+                    PokerHandEnum.FIVE_OF_A_KIND * SCORE_UNIT + ranks[0] + 2
+                continue
+            # 同じ番号のカードには異なるスートを割り当てる
+            hand_suits = [suits[ranks[:i].count(r)]
+                          for i, r in enumerate(ranks)]
+            distinct = len(set(ranks)) == 5
+            if distinct:
+                # 番号がすべて異なる場合はフラッシュとそれ以外の両方を作る
+                hand_suits[-1] = Suit.DIAMOND
+                flush[sum(1 << r for r in ranks)] = \
+                    cls.__score_of(ranks, [Suit.SPADE] * 5)
+            unsuited[cls.index(list(ranks))] = \
+                cls.__score_of(ranks, hand_suits)
+        return cls(flush, unsuited)
+
+    @staticmethod
+    def __score_of(ranks: tuple[int, ...], suits: list[Suit]) -> int:
+        hand = PokerHand()
+        for r, s in zip(ranks, suits):
+            # Aは番号 1で表す
+            hand.append(PokerCard(s, 1 if r == 12 else r + 2))
+        major, minor, _ = hand._PokerHand__evaluate_by_chain()
+        return major * SCORE_UNIT + minor
+
+
+def cache_path(filename: str) -> str:
+    """キャッシュのファイルを置くパス
+
+    $XDG_CACHE_HOME(なければ ~/.cache)の下の card_gameディレクトリに置く
+    ホームディレクトリがわからなければ一時ディレクトリを使う
+    """
+    base = os.environ.get("XDG_CACHE_HOME") \
+        or os.path.expanduser(os.path.join("~", ".cache"))
+    if base.startswith("~"):
+        base = tempfile.gettempdir()
+    return os.path.join(base, "card_game", filename)
+
+
+# 評価値の表のファイル(環境変数 POKER_SCORE_TABLEで変更できる)
+SCORE_TABLE_PATH = os.environ.get("POKER_SCORE_TABLE") \
+    or cache_path("score_table.bin")
+
+_score_table: ScoreTable | None = None
+
+
+def score_table() -> ScoreTable:
+    """評価値の表を返す
+
+    表は最初に使われたときに SCORE_TABLE_PATHから読み込む
+    ファイルがないか古い場合は作り直して書き出す
+    (書き出せなければメモリ上の表だけを使う)
+    """
+    global _score_table
+    if _score_table is None:
+        try:
+            _score_table = ScoreTable.load(SCORE_TABLE_PATH)
+        except (OSError, ValueError):
+            _score_table = ScoreTable.build()
+            try:
+                directory = os.path.dirname(SCORE_TABLE_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                _score_table.save(SCORE_TABLE_PATH)
+            except OSError:
+                pass
+    return _score_table
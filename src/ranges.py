@@ -0,0 +1,382 @@
+""" 2枚の手札の範囲(レンジ)同士の勝率を表にするモジュール
+
+    最初に持っている 2枚の組み合わせを、スートを入れ替えても同じになるものを
+    まとめた 169通りのクラス(AA, AKs, AKo, ...)で表す
+    各プレーヤーは 2枚を持ち、残りのカードから 5枚になるまで配られる
+    (equity.simulateと同じ遊び方)
+
+    2人の 2枚の組み合わせはスートの入れ替えで同じになるものをまとめてから
+    モンテカルロ法で勝敗を数え、結果を sqlite3のファイルに保存して使い回す
+
+    * HAND_CLASSES: 169通りのクラスの名前
+    * combos: クラスに含まれる 2枚の組み合わせ
+    * parse_range: 文字列のレンジを クラス → 重み の辞書にする
+    * class MatchupCache: 組み合わせごとの勝敗をファイルに保存する
+    * class RangeMatrix: レンジ同士の勝率の表
+    * class RangeEquity: レンジ同士の勝率を求める
+
+"""
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, permutations
+from typing import Iterable, Mapping, NamedTuple
+
+from equity import Equity, simulate
+from poker import PokerCard, ScoreTable, cache_path
+
+# 強い順の番号の文字(rank 12 → A, ..., 0 → 2)
+_RANK_CHARS = "23456789TJQKA"
+# スートの入れ替え 24通り
+_SUIT_PERMS = list(permutations(range(4)))
+
+
+def _card_id(suit: int, rank: int) -> int:
+    # スート(0..3)と rank(2 → 0, ..., A → 12)から通し番号を得る
+    return suit * 13 + (0 if rank == 12 else rank + 1)
+
+
+def _class_name(high: int, low: int, suited: bool) -> str:
+    # 2つの rank(high >= low)からクラスの名前を作る
+    name = _RANK_CHARS[high] + _RANK_CHARS[low]
+    if high == low:
+        return name
+    return name + ("s" if suited else "o")
+
+
+# 169通りのクラスの名前(強い番号の順)
+HAND_CLASSES = [_class_name(high, low, suited)
+                for high in range(12, -1, -1)
+                for low in range(high, -1, -1)
+                for suited in ((False,) if high == low else (True, False))]
+
+# クラスの名前 → (強いほうの rank, 弱いほうの rank, スーテッドか)
+_CLASS_RANKS = {_class_name(high, low, suited): (high, low, suited)
+                for high in range(13) for low in range(high + 1)
+                for suited in ((False,) if high == low else (True, False))}
+
+
+def combos(name: str) -> list[tuple[int, int]]:
+    """クラスに含まれる 2枚の組み合わせ(通し番号の組)
+
+    ペアは 6通り、スーテッドは 4通り、オフスーツは 12通り
+
+    Raises:
+        ValueError: クラスの名前が正しくない
+    """
+    if name not in _CLASS_RANKS:
+        raise ValueError(f"unknown hand class: {name!r}")
+    high, low, suited = _CLASS_RANKS[name]
+    if high == low:
+        return [(_card_id(s, high), _card_id(t, high))
+                for s, t in combinations(range(4), 2)]
+    if suited:
+        return [(_card_id(s, high), _card_id(s, low)) for s in range(4)]
+    return [(_card_id(s, high), _card_id(t, low))
+            for s in range(4) for t in range(4) if s != t]
+
+
+def parse_range(text: str) -> dict[str, float]:
+    """文字列のレンジを クラス → 重み の辞書にする
+
+    カンマか空白で区切ったクラスを並べる
+        "AA"     1つのクラス
+        "TT+"    TT以上のペア
+        "ATs+"   AをそのままにしたATs, AJs, AQs, AKs(オフスーツも同様)
+        "KQo:0.5" 重みを付ける(省略したら 1)
+
+    Raises:
+        ValueError: 書き方が正しくない
+    """
+    result: dict[str, float] = {}
+    for token in text.replace(",", " ").split():
+        item, _, weight_text = token.partition(":")
+        try:
+            weight = float(weight_text) if weight_text else 1.0
+        except ValueError:
+            raise ValueError(f"bad weight: {token!r}") from None
+        if weight < 0:
+            raise ValueError(f"negative weight: {token!r}")
+        plus = item.endswith("+")
+        name = item[:-1] if plus else item
+        if name not in _CLASS_RANKS:
+            raise ValueError(f"unknown hand class: {token!r}")
+        names = [name]
+        if plus:
+            high, low, suited = _CLASS_RANKS[name]
+            if high == low:
+                names = [_class_name(r, r, False) for r in range(low, 13)]
+            else:
+                names = [_class_name(high, r, suited)
+                         for r in range(low, high)]
+        for n in names:
+            result[n] = weight
+    return result
+
+
+def _canonical(a: tuple[int, int], b: tuple[int, int]) -> tuple[int, ...]:
+    # スートを入れ替えて最小になる (1人目の 2枚, 2人目の 2枚) の並び
+    best = None
+    for perm in _SUIT_PERMS:
+        ids = []
+        for hand in (a, b):
+            mapped = [perm[i // 13] * 13 + i % 13 for i in hand]
+            ids.extend(sorted(mapped))
+        key = tuple(ids)
+        if best is None or key < best:
+            best = key
+    return best
+
+
+# 組み合わせの結果を保存するファイル(環境変数 POKER_RANGE_CACHEで変更できる)
+RANGE_CACHE_PATH = os.environ.get("POKER_RANGE_CACHE") \
+    or cache_path("range_cache.sqlite3")
+
+
+class MatchupCache:
+    """組み合わせごとの勝敗を sqlite3のファイルに保存する
+
+    キーには評価値の表のフィンガープリントを含めるので、
+    役の定義が変わると古い結果は使われない
+    件数が maxsizeを超えたら、最後に使われたのが古いものから消す
+
+    Attributes:
+        path: ファイルのパス(Noneなら RANGE_CACHE_PATH、
+              ":memory:"ならメモリ上だけに置く)
+              RANGE_CACHE_PATHのファイルを開けないときは ":memory:"になる
+        maxsize: 保存する結果の数
+
+    Raises:
+        sqlite3.Error: 指定したファイルを開けない
+
+    """
+    def __init__(self, path: str | None = None,
+                 maxsize: int = 1 << 20) -> None:
+        self.maxsize = maxsize
+        if path is None:
+            try:
+                self.__db = self.__open(RANGE_CACHE_PATH)
+                self.path = RANGE_CACHE_PATH
+            except (OSError, sqlite3.Error):
+                # 書き込めない場所なら保存をあきらめてメモリ上に置く
+                self.__db = self.__open(":memory:")
+                self.path = ":memory:"
+        else:
+            self.__db = self.__open(path)
+            self.path = path
+        (used,) = self.__db.execute(
+            "SELECT COALESCE(MAX(used), 0) FROM matchups").fetchone()
+        # 使われた順番を表す通し番号
+        self.__clock = used
+
+    @staticmethod
+    def __open(path: str) -> sqlite3.Connection:
+        # ファイル(とディレクトリ)を開いて表を作る
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(path)
+        try:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS matchups ("
+                " key TEXT PRIMARY KEY, wins INTEGER, ties INTEGER,"
+                " losses INTEGER, trials INTEGER, used INTEGER)")
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS matchups_used ON matchups (used)")
+        except sqlite3.Error:
+            db.close()
+            raise
+        return db
+
+    def __len__(self) -> int:
+        (n,) = self.__db.execute("SELECT COUNT(*) FROM matchups").fetchone()
+        return n
+
+    def __enter__(self) -> "MatchupCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, Equity]:
+        """保存してある結果を引く(ないキーは結果に含めない)
+        """
+        found: dict[str, Equity] = {}
+        db = self.__db
+        for key in keys:
+            row = db.execute(
+                "SELECT wins, ties, losses, trials FROM matchups"
+                " WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                found[key] = Equity(*row)
+        if found:
+            self.__clock += 1
+            db.executemany("UPDATE matchups SET used = ? WHERE key = ?",
+                           [(self.__clock, key) for key in found])
+            db.commit()
+        return found
+
+    def put_many(self, items: Mapping[str, Equity]) -> None:
+        """結果を保存し、件数が maxsizeを超えたら古いものから消す
+        """
+        if not items:
+            return
+        self.__clock += 1
+        db = self.__db
+        db.executemany(
+            "INSERT OR REPLACE INTO matchups VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, *e, self.__clock) for key, e in items.items()])
+        excess = len(self) - self.maxsize
+        if excess > 0:
+            db.execute(
+                "DELETE FROM matchups WHERE key IN"
+                " (SELECT key FROM matchups ORDER BY used LIMIT ?)",
+                (excess,))
+        db.commit()
+
+    def clear(self) -> None:
+        self.__db.execute("DELETE FROM matchups")
+        self.__db.commit()
+
+    def close(self) -> None:
+        self.__db.close()
+
+
+class RangeMatrix(NamedTuple):
+    """レンジ同士の勝率の表
+
+    Attributes:
+        rows: 1人目のレンジのクラス
+        cols: 2人目のレンジのクラス
+        equity: equity[i][j] は rows[i]が cols[j]に対して得る勝率
+                (引き分けは半分として数える、同じカードを使う組み合わせは除く)
+        weights: weights[i][j] は rows[i]と cols[j]の組み合わせの重み
+                 (2人の重み * カードが重ならない組み合わせの数)
+        total: 1人目のレンジ全体の勝率(weightsで重み付けした平均)
+
+    """
+    rows: list[str]
+    cols: list[str]
+    equity: list[list[float]]
+    weights: list[list[float]]
+    total: float
+
+
+def _simulate_matchup(args: tuple[tuple[int, ...], int, int]) -> Equity:
+    # ワーカーで実行する 1つの組み合わせ分の試行
+    ids, trials, seed = args
+    cards = [PokerCard.from_id(i) for i in ids]
+    equity, _ = simulate([cards[:2], cards[2:]], trials=trials, seed=seed,
+                         shards=1, workers=1)
+    return equity
+
+
+class RangeEquity:
+    """レンジ同士の勝率を求める
+
+    2人の 2枚の組み合わせをスートの入れ替えで同じになるものにまとめ、
+    まとめたものごとに 1回だけモンテカルロ法で勝敗を数える
+    乱数は組み合わせと seedから作るので、同じ設定なら結果は毎回同じになり、
+    cacheに保存した結果をそのまま使える
+
+    Attributes:
+        trials: 組み合わせごとの試行回数
+        seed: 乱数の種
+        cache: 結果を保存する MatchupCache(Noneなら RANGE_CACHE_PATHのファイル、
+               保存したくないときは MatchupCache(":memory:")を渡す)
+
+    """
+    def __init__(self, *, trials: int = 2000, seed: int = 0,
+                 cache: MatchupCache | None = None) -> None:
+        self.trials = trials
+        self.seed = seed
+        self.cache = MatchupCache() if cache is None else cache
+        self.__prefix = f"{ScoreTable.fingerprint()}:{trials}:{seed}:"
+
+    def __key(self, ids: tuple[int, ...]) -> str:
+        return self.__prefix + ",".join(map(str, ids))
+
+    def __solve(self, matchups: set[tuple[int, ...]],
+                workers: int | None) -> dict[tuple[int, ...], Equity]:
+        # まとめた組み合わせの勝敗を、保存してあるものは引き、ないものは数える
+        keys = {ids: self.__key(ids) for ids in matchups}
+        found = self.cache.get_many(keys.values())
+        result = {ids: found[key] for ids, key in keys.items()
+                  if key in found}
+        missing = sorted(ids for ids in matchups if ids not in result)
+        work = [(ids, self.trials, hash((self.seed,) + ids))
+                for ids in missing]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1 or len(work) <= 1:
+            computed = list(map(_simulate_matchup, work))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                computed = list(executor.map(_simulate_matchup, work,
+                                             chunksize=8))
+        self.cache.put_many({keys[ids]: e
+                             for ids, e in zip(missing, computed)})
+        result.update(zip(missing, computed))
+        return result
+
+    def matchup(self, a: str, b: str) -> float:
+        """2つのクラスの勝率(1人目から見た値)
+        """
+        return self.matrix({a: 1.0}, {b: 1.0}).total
+
+    def matrix(self, range_a: Mapping[str, float] | str,
+               range_b: Mapping[str, float] | str, *,
+               workers: int | None = 1) -> RangeMatrix:
+        """2つのレンジの勝率の表を求める
+
+        Args:
+            range_a: 1人目のレンジ(クラス → 重み、または parse_rangeの文字列)
+            range_b: 2人目のレンジ
+            workers: 結果がない組み合わせを数えるプロセス数
+                     (Noneなら CPU数、1ならプロセスを使わない)
+
+        Returns:
+            RangeMatrix
+
+        Raises:
+            ValueError: クラスの名前が正しくない
+
+        """
+        if isinstance(range_a, str):
+            range_a = parse_range(range_a)
+        if isinstance(range_b, str):
+            range_b = parse_range(range_b)
+        rows = [n for n, w in range_a.items() if w > 0]
+        cols = [n for n, w in range_b.items() if w > 0]
+        row_combos = [combos(n) for n in rows]
+        col_combos = [combos(n) for n in cols]
+
+        # セルごとに、カードが重ならない組み合わせをまとめたものの一覧
+        cells = [[[_canonical(a, b) for a in ca for b in cb
+                   if not set(a) & set(b)]
+                  for cb in col_combos] for ca in row_combos]
+        solved = self.__solve({ids for row in cells for cell in row
+                               for ids in cell}, workers)
+
+        equity = []
+        weights = []
+        num = den = 0.0
+        for name_a, row in zip(rows, cells):
+            equity_row = []
+            weight_row = []
+            for name_b, cell in zip(cols, row):
+                value = 0.0
+                for ids in cell:
+                    e = solved[ids]
+                    value += (e.wins + e.ties / 2) / e.trials
+                value = value / len(cell) if cell else 0.0
+                weight = range_a[name_a] * range_b[name_b] * len(cell)
+                equity_row.append(value)
+                weight_row.append(weight)
+                num += value * weight
+                den += weight
+            equity.append(equity_row)
+            weights.append(weight_row)
+        return RangeMatrix(rows, cols, equity, weights,
+                           num / den if den else 0.0)
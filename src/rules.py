@@ -0,0 +1,371 @@
+""" トランプゲームのルールを差し替えて使うためのモジュール
+
+    ゲームごとにカードの強さや点数を通し番号(Card.id)で引く表として持ち、
+    ゲームごとに Cardのサブクラスを作らなくても同じデッキと配り方を使える
+    手札の評価は通し番号の並びで行い、NumPyの配列でまとめて評価することもできる
+    (まとめて評価するには NumPyが必要)
+
+    * class GameRules: ゲームのルールの基底クラス
+    * register: ルールを登録するクラスデコレータ
+    * get_rules: 名前から登録されたルールを得る
+    * available_games: 登録されたゲームの名前のリスト
+    * class PokerRules: ポーカー(5枚の役)
+    * class BlackjackRules: ブラックジャック(21に近いほど強い)
+    * class HeartsRules: ハーツ(失点が少ないほど良い)
+    * class DaifugoRules: 大富豪(出したカードの強さ)
+
+"""
+from abc import ABC, abstractmethod
+from typing import Callable, Sequence
+
+from card import Card, Deck, Suit
+from poker import PokerCard, score_table
+
+# 通し番号の数(ジョーカー 2枚を含む)
+_IDS = 54
+
+
+def _parts(card_id: int) -> tuple[int, int]:
+    # 通し番号から (スート(1..4、ジョーカーは 5), 番号(1..13、ジョーカーは 0, 1))
+    if card_id >= 52:
+        return Suit.JOKER, card_id - 52
+    suit, number = divmod(card_id, 13)
+    return suit + 1, number + 1
+
+
+def _numpy():
+    # まとめて評価するときだけ NumPyを読み込む
+    import numpy
+    return numpy
+
+
+class GameRules(ABC):
+    """ゲームのルールの基底クラス
+
+    サブクラスで表を作る関数と評価のメソッド(score, score_batch)を定義して
+    registerで登録する(評価のメソッドがないクラスは登録できない)
+    表は通し番号(0..53)で引くリストで、クラスを作ったときに 1度だけ計算する
+
+    Attributes:
+        name: ゲームの名前(登録に使う)
+        card_cls: デッキで使うカードのクラス(表示に使う)
+        jokers: デッキに入れるジョーカーの枚数
+        hand_size: 1人に配る枚数(Noneならすべてのカードを配り切る)
+        higher_is_better: 評価値が大きいほど良いか
+        strengths: 通し番号 → カードの強さ の表
+
+    """
+    name = ""
+    card_cls: type[Card] = Card
+    jokers = 0
+    hand_size: int | None = 5
+    higher_is_better = True
+    strengths: list[int] = []
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.strengths = [cls._strength_of(*_parts(i)) for i in range(_IDS)]
+
+    @staticmethod
+    def _strength_of(suit: int, number: int) -> int:
+        # カードの強さ(表を作るときに 1度だけ呼ばれる)
+        # デフォルトは Cardと同じ
+        if suit == Suit.JOKER:
+            return 0
+        return suit * 100 + number
+
+    def new_deck(self, rng=None) -> Deck:
+        """このゲームのデッキを作る
+        """
+        return Deck(card_cls=self.card_cls, joker=self.jokers, rng=rng)
+
+    def deal(self, deck: Deck, seats: int) -> list[list[int]]:
+        """デッキから 1人ずつ順番に配る
+
+        hand_sizeが Noneならデッキがなくなるまで配る(枚数が違う席もある)
+
+        Returns:
+            席ごとの通し番号のリスト
+
+        Raises:
+            IndexError: デッキの残りが足りない
+
+        """
+        count = self.hand_size
+        if count is None:
+            cards = deck.draw_many(deck.len)
+        else:
+            cards = deck.draw_many(seats * count)
+        hands: list[list[int]] = [[] for _ in range(seats)]
+        for i, card in enumerate(cards):
+            hands[i % seats].append(card.id)
+        return hands
+
+    def deal_batch(self, n: int, seats: int, rng=None):
+        """n個のデッキをまとめてシャッフルして、それぞれ seats人に配る
+
+        hand_sizeが Noneなら 1人分の枚数は (デッキの枚数 // seats)
+        NumPyが必要
+
+        Returns:
+            (n, seats, 枚数)の通し番号の配列
+
+        Raises:
+            ValueError: カードが足りない
+
+        """
+        from batch import shuffle_decks
+        size = 52 + self.jokers
+        count = self.hand_size
+        if count is None:
+            count = size // seats
+        if seats * count > size:
+            raise ValueError("not enough cards for all players")
+        decks = shuffle_decks(n, rng, size)
+        return decks[:, :seats * count].reshape(n, seats, count)
+
+    def sort(self, ids: Sequence[int], *, reverse: bool = False) -> list[int]:
+        """通し番号を強さの順に並べる
+        """
+        return sorted(ids, key=self.strengths.__getitem__, reverse=reverse)
+
+    @abstractmethod
+    def score(self, ids: Sequence[int]) -> int:
+        """手札の評価値を求める
+        """
+
+    @abstractmethod
+    def score_batch(self, ids):
+        """(N, 枚数)の通し番号の配列をまとめて評価する
+
+        結果は行ごとに scoreを呼んだものと一致する(NumPyが必要)
+        """
+
+    def winners(self, scores: Sequence[int]) -> list[int]:
+        """評価値が最も良い席の番号(同点なら複数)
+        """
+        best = max(scores) if self.higher_is_better else min(scores)
+        return [i for i, s in enumerate(scores) if s == best]
+
+
+# 登録されたルール(名前 → インスタンス)
+_REGISTRY: dict[str, GameRules] = {}
+
+
+def register(cls: type[GameRules]) -> type[GameRules]:
+    """ルールのクラスを登録するクラスデコレータ
+
+    Raises:
+        ValueError: 同じ名前のルールがすでにある
+        TypeError: 評価のメソッドが定義されていない
+    """
+    if cls.name in _REGISTRY:
+        raise ValueError(f"rules already registered: {cls.name}")
+    _REGISTRY[cls.name] = cls()
+    return cls
+
+
+def get_rules(name: str) -> GameRules:
+    """名前から登録されたルールを得る
+
+    Raises:
+        ValueError: 登録されていない名前
+    """
+    try:
+        return _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"unknown game: {name}") from None
+
+
+def available_games() -> list[str]:
+    """登録されたゲームの名前のリスト
+    """
+    return list(_REGISTRY)
+
+
+def _table(func: Callable[[int, int], int]) -> list[int]:
+    # 通し番号 → func(スート, 番号) の表
+    return [func(*_parts(i)) for i in range(_IDS)]
+
+
+@register
+class PokerRules(GameRules):
+    """ポーカー
+
+    評価値は PokerHand.scoreと同じ(poker.ScoreTableで引く)
+    6枚以上なら最も強い 5枚で評価する
+    """
+    name = "poker"
+    card_cls = PokerCard
+
+    @staticmethod
+    def _strength_of(suit: int, number: int) -> int:
+        if suit == Suit.JOKER:
+            return 0
+        return 14 if number == 1 else number
+
+    def score(self, ids: Sequence[int]) -> int:
+        # Raises:
+        #   ValueError: 5枚未満
+        if len(ids) < 5:
+            raise ValueError("needs at least 5 cards")
+        table = score_table()
+        if len(ids) == 5 and max(ids) < 52:
+            return table.lookup_ids(ids)
+        score, _ = table.best_ids(list(ids))
+        return score
+
+    def score_batch(self, ids):
+        # ジョーカーのない 5枚の行は batch.score_batchでまとめて評価し、
+        # それ以外(6枚以上、ジョーカー入り)は 1行ずつ scoreで評価する
+        # Raises:
+        #   ValueError: 2次元の配列でない、または 5枚未満
+        from batch import score_batch
+        np = _numpy()
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.ndim != 2:
+            raise ValueError(f"expected an (N, cards) array, got {ids.shape}")
+        if ids.shape[1] != 5:
+            return np.array([self.score(row) for row in ids.tolist()],
+                            dtype=np.int64).reshape(len(ids))
+        wild = (ids >= 52).any(axis=1)
+        if not wild.any():
+            return score_batch(ids)
+        scores = np.empty(len(ids), dtype=np.int64)
+        scores[~wild] = score_batch(ids[~wild])
+        scores[wild] = [self.score(row) for row in ids[wild].tolist()]
+        return scores
+
+
+@register
+class BlackjackRules(GameRules):
+    """ブラックジャック
+
+    Aは 1か 11、絵札は 10として、21を超えない最大の合計を評価値とする
+    21を超えたら 0、最初の 2枚で 21(ブラックジャック)なら 22とする
+    """
+    name = "blackjack"
+    hand_size = 2
+    # 通し番号 → 点数(Aは 1として数える)
+    values = _table(lambda s, n: 0 if s == Suit.JOKER else min(n, 10))
+
+    @staticmethod
+    def _strength_of(suit: int, number: int) -> int:
+        if suit == Suit.JOKER:
+            return 0
+        return 11 if number == 1 else min(number, 10)
+
+    def score(self, ids: Sequence[int]) -> int:
+        values = self.values
+        total = 0
+        ace = False
+        for i in ids:
+            v = values[i]
+            total += v
+            ace = ace or v == 1
+        if ace and total <= 11:
+            total += 10
+        if total > 21:
+            return 0
+        if total == 21 and len(ids) == 2:
+            return 22
+        return total
+
+    def score_batch(self, ids):
+        np = _numpy()
+        ids = np.asarray(ids, dtype=np.int64)
+        cards = np.asarray(self.values)[ids]
+        total = cards.sum(axis=1)
+        total += np.where((cards == 1).any(axis=1) & (total <= 11), 10, 0)
+        total[total > 21] = 0
+        if ids.shape[1] == 2:
+            total[total == 21] = 22
+        return total
+
+
+@register
+class HeartsRules(GameRules):
+    """ハーツ
+
+    ハートは 1点、スペードの Qは 13点の失点で、失点の合計を評価値とする
+    (少ないほど良い)
+    トリックは最初に出されたスートの中で最も強いカードが取る(Aが最強)
+    """
+    name = "hearts"
+    hand_size = 13
+    higher_is_better = False
+    # 通し番号 → 失点
+    points = _table(lambda s, n: 1 if s == Suit.HEART
+                    else 13 if (s, n) == (Suit.SPADE, 12) else 0)
+
+    @staticmethod
+    def _strength_of(suit: int, number: int) -> int:
+        if suit == Suit.JOKER:
+            return 0
+        return 14 if number == 1 else number
+
+    def score(self, ids: Sequence[int]) -> int:
+        points = self.points
+        return sum(points[i] for i in ids)
+
+    def score_batch(self, ids):
+        np = _numpy()
+        ids = np.asarray(ids, dtype=np.int64)
+        return np.asarray(self.points)[ids].sum(axis=1)
+
+    def trick_winner(self, ids: Sequence[int]) -> int:
+        """1トリック分のカード(出した順)のうち、トリックを取るカードの位置
+        """
+        led = ids[0] // 13
+        strengths = self.strengths
+        return max((k for k, i in enumerate(ids) if i // 13 == led),
+                   key=lambda k: strengths[ids[k]])
+
+
+@register
+class DaifugoRules(GameRules):
+    """大富豪
+
+    3が最弱、2が最強で、ジョーカー(1枚)はそれより強い
+    出したカード(同じ番号の 1枚以上、ジョーカーはどの番号の代わりにもなる)の
+    強さを評価値とし、番号がそろっていなければ 0とする
+    カードはすべて配り切る
+    """
+    name = "daifugo"
+    jokers = 1
+    hand_size = None
+
+    @staticmethod
+    def _strength_of(suit: int, number: int) -> int:
+        if suit == Suit.JOKER:
+            return 14
+        # 3 → 1, ..., K → 11, A → 12, 2 → 13
+        return (number - 3) % 13 + 1
+
+    def score(self, ids: Sequence[int]) -> int:
+        strengths = self.strengths
+        numbers = {strengths[i] for i in ids if i < 52}
+        if not numbers:
+            return 14 if ids else 0
+        if len(numbers) > 1:
+            return 0
+        (strength,) = numbers
+        return strength
+
+    def score_batch(self, ids):
+        np = _numpy()
+        ids = np.asarray(ids, dtype=np.int64)
+        cards = np.asarray(self.strengths)[ids]
+        joker = ids >= 52
+        low = np.where(joker, 15, cards).min(axis=1)
+        high = np.where(joker, 0, cards).max(axis=1)
+        return np.where(joker.all(axis=1), 14,
+                        np.where(low == high, high, 0))
+
+    def beats(self, play: Sequence[int], previous: Sequence[int]) -> bool:
+        """直前に出されたカードに playを出せるか(同じ枚数でより強い)
+        """
+        if len(play) != len(previous):
+            return False
+        strength = self.score(play)
+        return strength > 0 and strength > self.score(previous)
@@ -0,0 +1,520 @@
+""" asyncioでポーカーのテーブルを多数ホストするサーバー
+
+    1つのイベントループで多数のテーブルを同時に進める
+    テーブルごとの操作はロックで順番に行い、手札の評価と交換するカードの選択は
+    短い間隔でまとめてエグゼキュータ(スレッドまたはプロセス)で行う
+    まとめる前のキューが一杯になると新しい操作を待たせる(バックプレッシャー)
+
+    プロトコルは 1行 1コマンドのテキストで、応答は 1行の JSON
+        NEW [席数]                  テーブルを作る → {"ok": true, "table": 番号}
+        DEAL テーブル               全員に 5枚ずつ配る
+        EXCHANGE テーブル           全員の交換するカードを自動で選んで交換する
+        EXCHANGE テーブル 席 位置   1人分を交換する(位置は 0始まりのカンマ区切り、
+                                    交換しないときは -)
+        SHOWDOWN テーブル           役を比べて勝者を決める
+        STATS                       操作ごとの処理時間の統計
+        QUIT                        接続を閉じる
+    エラーのときは {"ok": false, "error": メッセージ}
+
+    * class LatencyStats: 1種類の操作の処理時間の統計
+    * class TableServer: テーブルをホストするサーバー
+    * load_test: ローカルのサーバーに多数のクライアントから接続して負荷をかける
+
+    実行例:
+        PYTHONPATH=./src python src/server.py serve --port 8765
+        PYTHONPATH=./src python src/server.py load --port 8765 --clients 50
+
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from random import Random
+from typing import Any, Callable
+
+from card import Deck
+from exchange import ExchangeEngine
+from poker import HAND_NAMES, PokerCard, PokerHand, SCORE_UNIT, score_table
+
+# 記録する操作
+ACTIONS = ("deal", "exchange", "showdown")
+
+
+class LatencyStats:
+    """1種類の操作の処理時間の統計
+
+    分位数は直近 window回分の処理時間から求める
+
+    Attributes:
+        count: 記録した回数
+        total: 処理時間の合計(秒)
+        max: 最大の処理時間(秒)
+
+    """
+    def __init__(self, window: int = 10000) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.__recent: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.__recent.append(seconds)
+
+    def snapshot(self) -> dict[str, float]:
+        """JSONに変換できる辞書で返す(時間はミリ秒)
+        """
+        recent = sorted(self.__recent)
+
+        def quantile(q: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(q * len(recent)))] * 1e3
+
+        return {"count": self.count,
+                "mean_ms": self.total / self.count * 1e3 if self.count
+                else 0.0,
+                "p50_ms": quantile(0.50), "p90_ms": quantile(0.90),
+                "p99_ms": quantile(0.99), "max_ms": self.max * 1e3}
+
+
+# -------------------------------------------------------
+# エグゼキュータで実行する処理(プロセスに渡せるようモジュールの関数にする)
+# -------------------------------------------------------
+def _score_tables(tables: list[list[list[int]]]) -> list[list[int]]:
+    # テーブルごとの手札(カードの通し番号のリスト)の評価値
+    table = score_table()
+    return [[table.best_ids(ids)[0] for ids in hands] for hands in tables]
+
+
+# スレッドごと(プロセスならプロセスごと)に ExchangeEngineを使い回す
+_local = threading.local()
+
+
+def _decide_tables(tables: list[list[list[int]]]) \
+        -> list[list[tuple[int, ...]]]:
+    # テーブルごとの手札の捨てるカードの位置
+    engine = getattr(_local, "engine", None)
+    if engine is None:
+        engine = _local.engine = ExchangeEngine()
+    result = []
+    for hands in tables:
+        decisions = []
+        for ids in hands:
+            hand = PokerHand()
+            for i in ids:
+                hand.append(PokerCard.from_id(i))
+            decisions.append(engine.best(hand).discard)
+        result.append(decisions)
+    return result
+
+
+class _Batcher:
+    # submitされた項目を短い間隔でまとめて funcに渡し、結果を個別に返す
+    # キューが一杯のときは submitが待つ(バックプレッシャー)
+    # closeすると、結果を待っている項目はすべて RuntimeErrorになる
+    def __init__(self, func: Callable[[list], list],
+                 executor: Executor | None, *, batch_size: int,
+                 delay: float, max_pending: int, concurrency: int) -> None:
+        self.__func = func
+        self.__executor = executor
+        self.__batch_size = batch_size
+        self.__delay = delay
+        self.__queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self.__running = asyncio.Semaphore(concurrency)
+        self.__task: asyncio.Task | None = None
+        self.__batches: set[asyncio.Task] = set()
+        self.__closed = False
+
+    @property
+    def pending(self) -> int:
+        return self.__queue.qsize()
+
+    async def submit(self, item: Any) -> Any:
+        if self.__closed:
+            raise RuntimeError("server is closing")
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__collect())
+        future = asyncio.get_running_loop().create_future()
+        await self.__queue.put((item, future))
+        if self.__closed:
+            # キューが空くのを待っている間に closeされた
+            self.__fail_queued()
+        return await future
+
+    async def __collect(self) -> None:
+        queue = self.__queue
+        while True:
+            batch = [await queue.get()]
+            try:
+                if queue.qsize() < self.__batch_size - 1 and self.__delay:
+                    # 少ないときは他の項目がたまるのを少し待つ
+                    await asyncio.sleep(self.__delay)
+                while len(batch) < self.__batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+                await self.__running.acquire()
+            except asyncio.CancelledError:
+                self.__fail(batch)
+                raise
+            task = asyncio.create_task(self.__run(batch))
+            self.__batches.add(task)
+            task.add_done_callback(self.__batches.discard)
+
+    async def __run(self, batch: list[tuple[Any, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.__executor, self.__func, [item for item, _ in batch])
+        except Exception as e:
+            self.__fail(batch, e)
+        except asyncio.CancelledError:
+            self.__fail(batch)
+            raise
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.__running.release()
+
+    @staticmethod
+    def __fail(batch: list[tuple[Any, asyncio.Future]],
+               error: BaseException | None = None) -> None:
+        # まだ結果の出ていない項目を例外で終わらせる
+        if error is None:
+            error = RuntimeError("server is closing")
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def __fail_queued(self) -> None:
+        # キューに残っている項目をすべて例外で終わらせる
+        queue = self.__queue
+        batch = []
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        self.__fail(batch)
+
+    async def close(self) -> None:
+        self.__closed = True
+        tasks = list(self.__batches)
+        if self.__task is not None:
+            tasks.append(self.__task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.__fail_queued()
+
+
+class _LiveTable:
+    # サーバーがホストする 1つのテーブル
+    def __init__(self, number: int, seats: int, rng: Random) -> None:
+        self.number = number
+        self.deck = Deck(card_cls=PokerCard, joker=False, rng=rng)
+        self.players = [PokerHand(str(i)) for i in range(seats)]
+        self.lock = asyncio.Lock()
+        self.dealt = False
+        self.exchanged: set[int] = set()
+
+    def hands(self) -> list[list[int]]:
+        return [[c.id for c in p.cards] for p in self.players]
+
+    def view(self) -> list[list[str]]:
+        return [[str(c) for c in p.cards] for p in self.players]
+
+
+class TableServer:
+    """テーブルをホストするサーバー
+
+    Attributes:
+        latency: 操作の名前(ACTIONS)ごとの LatencyStats
+
+    """
+    def __init__(self, *, executor: Executor | None = None,
+                 batch_size: int = 64, batch_delay: float = 0.001,
+                 max_pending: int = 1024, concurrency: int = 4,
+                 max_tables: int = 100000, seed: int | None = None) -> None:
+        # Keyword parameters:
+        #   executor: 評価に使うエグゼキュータ(Noneならイベントループの既定)
+        #   batch_size: まとめて評価する最大のテーブル数
+        #   batch_delay: まとめるために待つ時間(秒)
+        #   max_pending: 評価待ちのテーブル数の上限(超えると操作を待たせる)
+        #   concurrency: 同時にエグゼキュータに渡すまとまりの数
+        #   max_tables: テーブル数の上限
+        #   seed: テーブルの乱数の種(Noneなら毎回異なる)
+        self.__options = dict(batch_size=batch_size, delay=batch_delay,
+                              max_pending=max_pending,
+                              concurrency=concurrency)
+        self.__executor = executor
+        self.__max_tables = max_tables
+        self.__rng = Random(seed)
+        self.__tables: dict[int, _LiveTable] = {}
+        self.__scorer: _Batcher | None = None
+        self.__decider: _Batcher | None = None
+        self.__server: asyncio.AbstractServer | None = None
+        self.latency = {action: LatencyStats() for action in ACTIONS}
+
+    def __batchers(self) -> tuple[_Batcher, _Batcher]:
+        # イベントループの中で作る必要があるので最初に使うときに作る
+        if self.__scorer is None:
+            self.__scorer = _Batcher(_score_tables, self.__executor,
+                                     **self.__options)
+            self.__decider = _Batcher(_decide_tables, self.__executor,
+                                      **self.__options)
+        return self.__scorer, self.__decider
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) \
+            -> tuple[str, int]:
+        """接続の受け付けを始める
+
+        Returns:
+            (ホスト, ポート番号)(port = 0なら空いているポートを使う)
+        """
+        self.__server = await asyncio.start_server(self.handle, host, port)
+        return self.__server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        """接続の受け付けをやめ、評価待ちの処理を止める
+        """
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+        for batcher in (self.__scorer, self.__decider):
+            if batcher is not None:
+                await batcher.close()
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """1つの接続のコマンドを順に処理する
+
+        応答を書き終える(drain)まで次のコマンドを読まないので、
+        読み出しの遅いクライアントはそれ以上コマンドを送れなくなる
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or line.strip().upper() == b"QUIT":
+                    break
+                response = await self.execute(line.decode().strip())
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # 切断された、または 1行が長すぎる
+            pass
+        finally:
+            writer.close()
+
+    async def execute(self, command: str) -> dict[str, Any]:
+        """1行のコマンドを実行して応答を返す
+        """
+        words = command.split()
+        if not words:
+            return {"ok": False, "error": "empty command"}
+        name, args = words[0].upper(), words[1:]
+        try:
+            if name == "NEW":
+                return {"ok": True, "table": self.new_table(
+                    int(args[0]) if args else 5)}
+            if name == "STATS":
+                return {"ok": True, "stats": self.stats()}
+            action = name.lower()
+            if action not in ACTIONS or not args:
+                raise ValueError(f"unknown command: {command}")
+            table = self.__table(int(args[0]))
+            start = time.perf_counter()
+            async with table.lock:
+                if action == "deal":
+                    result = self.__deal(table)
+                elif action == "exchange":
+                    result = await self.__exchange(table, args[1:])
+                else:
+                    result = await self.__showdown(table)
+            self.latency[action].record(time.perf_counter() - start)
+            return {"ok": True, **result}
+        except (ValueError, IndexError, KeyError) as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            # 評価やエグゼキュータの失敗も接続を切らずにエラーとして返す
+            return {"ok": False, "error": f"{e.__class__.__name__}: {e}"}
+
+    def new_table(self, seats: int = 5) -> int:
+        """テーブルを作って番号を返す
+
+        Raises:
+            ValueError: 席数が 2 ~ 6でない、テーブル数が上限に達した
+        """
+        if not 2 <= seats <= 6:
+            raise ValueError(f"seats must be 2 to 6: {seats}")
+        if len(self.__tables) >= self.__max_tables:
+            raise ValueError("too many tables")
+        number = len(self.__tables)
+        self.__tables[number] = _LiveTable(
+            number, seats, Random(self.__rng.getrandbits(64)))
+        return number
+
+    def __table(self, number: int) -> _LiveTable:
+        table = self.__tables.get(number)
+        if table is None:
+            raise KeyError(f"no such table: {number}")
+        return table
+
+    @staticmethod
+    def __deal(table: _LiveTable) -> dict[str, Any]:
+        deck = table.deck
+        deck.reset()
+        # 交換で引く分までシャッフルする
+        deck.shuffle(min(deck.len, 10 * len(table.players)))
+        for player in table.players:
+            player.cards[:] = deck.draw_many(5)
+        table.dealt = True
+        table.exchanged.clear()
+        return {"hands": table.view()}
+
+    async def __exchange(self, table: _LiveTable,
+                         args: list[str]) -> dict[str, Any]:
+        if not table.dealt:
+            raise ValueError("deal first")
+        if args:
+            # 1人分を指定された位置で交換する
+            seat = int(args[0])
+            positions = () if len(args) < 2 or args[1] == "-" \
+                else tuple(sorted({int(p) for p in args[1].split(",")}))
+            if not 0 <= seat < len(table.players) \
+                    or any(not 0 <= p < 5 for p in positions):
+                raise ValueError("invalid seat or card position")
+            if seat in table.exchanged:
+                raise ValueError(f"seat {seat} has already exchanged")
+            discards = {seat: positions}
+        else:
+            # 交換していない全員の捨てるカードを自動で選ぶ
+            _, decider = self.__batchers()
+            chosen = await decider.submit(table.hands())
+            discards = {seat: d for seat, d in enumerate(chosen)
+                        if seat not in table.exchanged}
+        if sum(len(d) for d in discards.values()) > table.deck.len:
+            raise ValueError("not enough cards left in the deck")
+        for seat, positions in discards.items():
+            cards = table.players[seat].cards
+            for p in sorted(positions, reverse=True):
+                del cards[p]
+            cards.extend(table.deck.draw_many(len(positions)))
+            table.exchanged.add(seat)
+        return {"discards": {str(s): list(d) for s, d in discards.items()},
+                "hands": table.view()}
+
+    async def __showdown(self, table: _LiveTable) -> dict[str, Any]:
+        if not table.dealt:
+            raise ValueError("deal first")
+        scorer, _ = self.__batchers()
+        scores = await scorer.submit(table.hands())
+        best = max(scores)
+        table.dealt = False
+        return {"winners": [s for s, v in enumerate(scores) if v == best],
+                "categories": [HAND_NAMES[v // SCORE_UNIT] for v in scores],
+                "hands": table.view()}
+
+    def stats(self) -> dict[str, Any]:
+        """操作ごとの処理時間の統計と評価待ちの数
+        """
+        return {"tables": len(self.__tables),
+                "pending": {"showdown": self.__scorer.pending
+                            if self.__scorer else 0,
+                            "exchange": self.__decider.pending
+                            if self.__decider else 0},
+                "latency": {a: s.snapshot() for a, s in self.latency.items()}}
+
+
+async def _client(host: str, port: int, rounds: int, seats: int,
+                  stats: dict[str, LatencyStats]) -> None:
+    # 1つのクライアント: テーブルを作って rounds回プレイする
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def call(command: str) -> dict[str, Any]:
+        writer.write(command.encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response
+
+    try:
+        table = (await call(f"NEW {seats}"))["table"]
+        for _ in range(rounds):
+            for action in ACTIONS:
+                start = time.perf_counter()
+                await call(f"{action.upper()} {table}")
+                stats[action].record(time.perf_counter() - start)
+        writer.write(b"QUIT\n")
+        await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def load_test(host: str, port: int, *, clients: int = 10,
+                    rounds: int = 100, seats: int = 5) -> dict[str, Any]:
+    """ローカルのサーバーに多数のクライアントから接続して負荷をかける
+
+    各クライアントはテーブルを 1つ作り、配る・交換する・勝負するを
+    rounds回繰り返す
+
+    Returns:
+        クライアント側で測った操作ごとの応答時間の統計と、1秒あたりのラウンド数
+    """
+    stats = {action: LatencyStats() for action in ACTIONS}
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, rounds, seats, stats)
+                           for _ in range(clients)))
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds,
+            "rounds_per_second": clients * rounds / seconds,
+            "latency": {a: s.snapshot() for a, s in stats.items()}}
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        server = TableServer(executor=executor, seed=args.seed)
+        host, port = await server.start(args.host, args.port)
+        print(f"serving on {host}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="mode", required=True)
+    serve = sub.add_parser("serve", help="サーバーを起動する")
+    serve.add_argument("--workers", type=int, default=None,
+                       help="評価に使うプロセス数(デフォルト CPU数)")
+    serve.add_argument("--seed", type=int, default=None)
+    load = sub.add_parser("load", help="サーバーに負荷をかける")
+    load.add_argument("--clients", type=int, default=10)
+    load.add_argument("--rounds", type=int, default=100)
+    load.add_argument("--seats", type=int, default=5)
+    for p in (serve, load):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.mode == "serve":
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        result = asyncio.run(load_test(args.host, args.port,
+                                       clients=args.clients,
+                                       rounds=args.rounds, seats=args.seats))
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
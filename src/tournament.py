@@ -0,0 +1,162 @@
+""" 多数のテーブルでポーカーを並行して行うモジュール
+
+    * class RoundResult: 1テーブル 1ラウンド分の結果
+    * class TournamentStats: 全体の集計結果
+    * class Table: デッキと手札を使い回して何ラウンドも行うテーブル
+    * iter_rounds: 全テーブルのラウンドの結果を順に返すイテレータ
+    * run: 全テーブルのラウンドを行い、結果をコールバックに渡して集計する
+
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from typing import Callable, Iterator, NamedTuple
+
+from card import Deck, spawn_rngs
+from poker import (PokerCard, PokerHand, PokerHandEnum, SCORE_UNIT,
+                   showdown)
+
+
+class RoundResult(NamedTuple):
+    """1テーブル 1ラウンド分の結果
+
+    Attributes:
+        table: テーブル番号
+        round: ラウンド番号
+        winners: 勝ったプレーヤーの名前(引き分けなら複数)
+        categories: 席順に並べた各プレーヤーの役
+        draw: 引き分けかどうか
+
+    """
+    table: int
+    round: int
+    winners: tuple[str, ...]
+    categories: tuple[PokerHandEnum, ...]
+    draw: bool
+
+
+class TournamentStats(NamedTuple):
+    """全体の集計結果
+
+    Attributes:
+        tables: テーブル数
+        rounds: 行ったラウンドの総数
+        hands: 評価した手札の総数
+        draws: 引き分けになったラウンドの数
+        seconds: かかった時間(秒)
+
+    """
+    tables: int
+    rounds: int
+    hands: int
+    draws: int
+    seconds: float
+
+    @property
+    def hands_per_second(self) -> float:
+        return self.hands / self.seconds if self.seconds else 0.0
+
+
+class Table:
+    """デッキと手札を使い回して何ラウンドも行うテーブル
+
+    Attributes:
+        number: テーブル番号
+        deck: テーブル専用のデッキ
+        players: 席順に並べたプレーヤーの手札
+
+    """
+    def __init__(self, number: int, seats: int = 5,
+                 rng: Random | None = None) -> None:
+        if not 2 <= seats <= 10:
+            raise ValueError(f"seats must be 2 to 10: {seats}")
+        self.number = number
+        self.deck = Deck(card_cls=PokerCard, joker=False, rng=rng)
+        self.players = [PokerHand(str(i)) for i in range(1, seats + 1)]
+
+    def play_round(self, number: int) -> RoundResult:
+        """1ラウンド行う
+
+        デッキを元に戻して配る分だけシャッフルし、各プレーヤーに 5枚ずつ配る
+        """
+        deck = self.deck
+        deck.reset()
+        deck.shuffle(5 * len(self.players))
+        for player in self.players:
+            player.cards[:] = deck.draw_many(5)
+
+        winners = showdown(self.players)
+        categories = tuple(PokerHandEnum(p.score // SCORE_UNIT)
+                           for p in self.players)
+        return RoundResult(self.number, number,
+                           tuple(p.name for p in winners),
+                           categories, len(winners) > 1)
+
+
+def _play_tables(args: tuple[list[tuple[int, Random]], int, int]) \
+        -> list[RoundResult]:
+    # ワーカーで実行する 1単位分(複数テーブル)のラウンド
+    tables, rounds, seats = args
+    results = []
+    for number, rng in tables:
+        table = Table(number, seats, rng)
+        for r in range(rounds):
+            results.append(table.play_round(r))
+    return results
+
+
+def iter_rounds(tables: int, rounds: int, *, seats: int = 5,
+                seed: int | None = None, workers: int | None = None,
+                batch_size: int = 64) -> Iterator[RoundResult]:
+    """全テーブルのラウンドの結果を順に返す
+
+    テーブルを batch_size個ずつまとめてワーカーに渡し、
+    まとまりが終わるごとにテーブル番号・ラウンド番号の順で結果を返す
+    テーブルごとの乱数生成器は seedから作るので、seedが同じなら
+    workersや batch_sizeによらず同じ結果になる
+
+    Args:
+        tables: テーブル数
+        rounds: 1テーブルあたりのラウンド数
+        seats: 1テーブルの人数(2 ~ 10)
+        seed: 乱数の種(Noneなら毎回異なる)
+        workers: プロセス数(Noneなら CPU数、1ならプロセスを使わない)
+        batch_size: 1つのワーカーにまとめて渡すテーブル数
+
+    """
+    rngs = spawn_rngs(seed, tables)
+    work = [(list(zip(range(start, min(start + batch_size, tables)),
+                      rngs[start:start + batch_size])), rounds, seats)
+            for start in range(0, tables, batch_size)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for unit in work:
+            yield from _play_tables(unit)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(_play_tables, work):
+            yield from results
+
+
+def run(tables: int, rounds: int, *,
+        callback: Callable[[RoundResult], None] | None = None,
+        **kwargs) -> TournamentStats:
+    """全テーブルのラウンドを行い、結果を 1つずつ callbackに渡して集計する
+
+    キーワード引数は iter_roundsと同じ
+
+    Returns:
+        TournamentStats
+    """
+    start = time.perf_counter()
+    count = hands = draws = 0
+    for result in iter_rounds(tables, rounds, **kwargs):
+        count += 1
+        hands += len(result.categories)
+        draws += result.draw
+        if callback is not None:
+            callback(result)
+    return TournamentStats(tables, count, hands, draws,
+                           time.perf_counter() - start)
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+from poker import PokerCard, PokerHand, PokerHandEnum
+from card import Suit
+
+np = pytest.importorskip("numpy")
+batch = pytest.importorskip("batch")
+
+
+class TestBatch:
+    """まとめて評価するテスト
+    """
+    def test_batch_matches_evaluate(self):
+        """PokerHand.evaluateと同じ結果になる
+        """
+        rng = random.Random(0)
+        hands = []
+        for _ in range(2000):
+            hand = PokerHand()
+            for i in rng.sample(range(52), 5):
+                hand.append(PokerCard.from_id(i))
+            hands.append(hand)
+        major, minor = batch.evaluate_batch(batch.encode_hands(hands))
+        for hand, a, b in zip(hands, major, minor):
+            hand.evaluate()
+            assert (hand.major, hand.minor) == (a, b)
+
+    def test_royal_straight_flush(self):
+        """ロイヤルストレートフラッシュ
+        """
+        ids = [[PokerCard(Suit.SPADE, n).id for n in (1, 10, 11, 12, 13)]]
+        major, minor = batch.evaluate_batch(ids)
+        assert major[0] == PokerHandEnum.ROYAL_STRAIGHT_FLUSH
+        assert minor[0] == 1413121110
+
+    def test_wheel(self):
+        """A-2-3-4-5のストレートとストレートフラッシュ
+        """
+        ids = [[PokerCard(s, n).id for s, n in zip(suits, (1, 2, 3, 4, 5))]
+               for suits in ([Suit.SPADE] * 5, [Suit.SPADE] * 4 + [Suit.CLUB])]
+        major, minor = batch.evaluate_batch(ids)
+        assert list(major) == [PokerHandEnum.STRAIGHT_FLUSH,
+                               PokerHandEnum.STRAIGHT]
+        assert list(minor) == [504030201, 504030201]
+
+    def test_invalid_shape(self):
+        """(N, 5)でない配列はエラー
+        """
+        with pytest.raises(ValueError):
+            batch.evaluate_batch([[0, 1, 2, 3]])
+
+
+class TestShuffle:
+    """まとめてシャッフルするテスト
+    """
+    def test_shuffle_decks(self):
+        """各行が 52枚の並べ替えになり、seedが同じなら同じ結果になる
+        """
+        decks = batch.shuffle_decks(100, 5)
+        assert decks.shape == (100, 52)
+        assert (np.sort(decks, axis=1) == np.arange(52)).all()
+        assert (decks == batch.shuffle_decks(100, 5)).all()
+
+    def test_deal_hands(self):
+        """配った手札をそのまま評価できる
+        """
+        a, b = batch.spawn_generators(1, 2)
+        hands = batch.deal_hands(10, 4, a)
+        assert hands.shape == (10, 4, 5)
+        major, _ = batch.evaluate_batch(hands.reshape(-1, 5))
+        assert len(major) == 40
+        assert not (hands == batch.deal_hands(10, 4, b)).all()
+
+
+class TestHandBatch:
+    """列ごとの配列で手札を持つ入れ物のテスト
+    """
+    def setup_method(self):
+        """セットアップ
+
+            1000個の手札を配る
+        """
+        self.hands = batch.HandBatch.deal(1000, rng=3)
+
+    def test_lazy_columns_match_evaluate(self):
+        """評価値と役の列は参照したときに求め、PokerHandと一致する
+        """
+        view = self.hands[100:200]
+        assert np.shares_memory(view.ids, self.hands.ids)
+        for i in (0, 50, 99):
+            hand = view.to_hand(i)
+            assert hand.score == view.scores[i]
+            assert hand.evaluate() == view.name(i)
+        assert isinstance(view[0], PokerHand)
+
+    def test_sort_and_filter(self):
+        """評価値の順の並べ替えと、役による絞り込み
+        """
+        ordered = self.hands.sort()
+        assert len(ordered) == 1000
+        assert (np.diff(ordered.scores) <= 0).all()
+        pairs = self.hands.filter(PokerHandEnum.ONE_PAIR,
+                                  PokerHandEnum.TWO_PAIR)
+        assert set(pairs.categories.tolist()) <= {PokerHandEnum.ONE_PAIR,
+                                                  PokerHandEnum.TWO_PAIR}
+        counts = self.hands.counts()
+        assert len(pairs) == counts.get(PokerHandEnum.ONE_PAIR, 0) \
+            + counts.get(PokerHandEnum.TWO_PAIR, 0)
+        assert sum(counts.values()) == 1000
+
+    def test_invalid_ids(self):
+        """(N, 5)でない配列や範囲外の通し番号はエラー
+        """
+        with pytest.raises(ValueError):
+            batch.HandBatch([[0, 1, 2, 3]])
+        with pytest.raises(ValueError):
+            batch.HandBatch([[0, 1, 2, 3, 52]])
@@ -0,0 +1,119 @@
+import pytest
+
+from itertools import combinations
+
+from card import Suit
+from equity import ExactOdds, simulate
+from poker import PokerCard, PokerHandEnum, score_table
+
+
+class TestSimulate:
+    """モンテカルロ法による勝率のテスト
+    """
+    def setup_method(self):
+        """セットアップ
+
+            1人目は Aのフォーカード、2人目は何も持っていない
+        """
+        self.hands = [
+            [PokerCard(s, 1) for s in (Suit.CLUB, Suit.DIAMOND,
+                                       Suit.HEART, Suit.SPADE)],
+            [],
+        ]
+
+    def test_counts_add_up(self):
+        """勝ち・引き分け・負けの合計が試行回数になる
+        """
+        result = simulate(self.hands, trials=500, seed=1, workers=1)
+        for e in result:
+            assert e.wins + e.ties + e.losses == 500
+        assert result[0].win_rate > 0.99
+
+    def test_same_seed_same_result(self):
+        """seedが同じならプロセス数によらず同じ結果になる
+        """
+        a = simulate([[], []], trials=300, seed=7, workers=1)
+        b = simulate([[], []], trials=300, seed=7, workers=2)
+        assert a == b
+
+    def test_duplicate_card(self):
+        """同じカードを 2回使うとエラー
+        """
+        with pytest.raises(ValueError):
+            simulate(self.hands, dead=[PokerCard(Suit.CLUB, 1)], workers=1)
+
+
+class TestExactOdds:
+    """全数列挙のテスト
+    """
+    def test_full_deck_distribution(self):
+        """52枚から 5枚選ぶすべての手札の役の数
+        """
+        dist = ExactOdds().distribution()
+        assert sum(dist.values()) == 2598960
+        assert dist[PokerHandEnum.ROYAL_STRAIGHT_FLUSH] == 4
+        # A-2-3-4-5のストレートフラッシュを含む
+        assert dist[PokerHandEnum.STRAIGHT_FLUSH] == 36
+        assert dist[PokerHandEnum.FOUR_OF_A_KIND] == 624
+        assert dist[PokerHandEnum.FULL_HOUSE] == 3744
+        assert dist[PokerHandEnum.FLUSH] == 5108
+        assert dist[PokerHandEnum.STRAIGHT] == 10200
+        assert dist[PokerHandEnum.THREE_OF_A_KIND] == 54912
+        assert dist[PokerHandEnum.TWO_PAIR] == 123552
+        assert dist[PokerHandEnum.ONE_PAIR] == 1098240
+        assert dist[PokerHandEnum.NO_PAIR] == 1302540
+
+    def test_incremental_update(self):
+        """カードを 1枚変えたときの結果が数え直した結果と一致する
+        """
+        odds = ExactOdds()
+        odds.distribution([PokerCard(Suit.SPADE, 1), PokerCard(Suit.HEART, 1)])
+        changed = [PokerCard(Suit.SPADE, 1), PokerCard(Suit.HEART, 9)]
+        assert odds.distribution(changed) == ExactOdds().distribution(changed)
+
+    def test_head_to_head(self):
+        """1対 1の勝敗の数が対称になる
+        """
+        a = [PokerCard(Suit.SPADE, 1), PokerCard(Suit.HEART, 1),
+             PokerCard(Suit.CLUB, 2), PokerCard(Suit.CLUB, 3)]
+        b = [PokerCard(Suit.SPADE, 13), PokerCard(Suit.HEART, 13),
+             PokerCard(Suit.CLUB, 4), PokerCard(Suit.CLUB, 5)]
+        ea, eb = ExactOdds().head_to_head(a, b)
+        assert ea.trials == 44 * 43
+        assert (ea.wins, ea.ties) == (eb.losses, eb.ties)
+        assert ea.wins > ea.losses
+
+    def test_head_to_head_matches_pairs(self):
+        """カードの重ならない組み合わせの組をすべて比べた結果と一致する
+        """
+        a = [PokerCard(Suit.SPADE, 1), PokerCard(Suit.SPADE, 13),
+             PokerCard(Suit.SPADE, 12), PokerCard(Suit.HEART, 2)]
+        b = [PokerCard(Suit.HEART, 10), PokerCard(Suit.DIAMOND, 10),
+             PokerCard(Suit.SPADE, 11)]
+        dead = [PokerCard(Suit.CLUB, 10)]
+        used = {c.id for c in a + b + dead}
+        rest = [i for i in range(52) if i not in used]
+        lookup = score_table().lookup_ids
+        ids_a = [c.id for c in a]
+        ids_b = [c.id for c in b]
+        wins = ties = losses = 0
+        for x in rest:
+            score_a = lookup(ids_a + [x])
+            for ys in combinations([i for i in rest if i != x], 2):
+                score_b = lookup(ids_b + list(ys))
+                wins += score_a > score_b
+                ties += score_a == score_b
+                losses += score_a < score_b
+        ea, eb = ExactOdds().head_to_head(a, b, dead)
+        assert (ea.wins, ea.ties, ea.losses) == (wins, ties, losses)
+        assert ea.trials == 44 * 43 * 42 // 2
+
+    def test_head_to_head_two_cards(self):
+        """2枚ずつの手札でもすべての組み合わせを数えられる
+        """
+        a = [PokerCard(Suit.SPADE, 1), PokerCard(Suit.HEART, 1)]
+        b = [PokerCard(Suit.CLUB, 7), PokerCard(Suit.CLUB, 8)]
+        ea, eb = ExactOdds().head_to_head(a, b)
+        assert ea.trials == 17296 * 14190
+        assert (ea.wins, ea.ties) == (eb.losses, eb.ties)
+        assert ea.wins > ea.losses
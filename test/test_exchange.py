@@ -0,0 +1,96 @@
+from itertools import combinations
+
+import pytest
+
+from card import Deck, Suit
+from exchange import ExchangeEngine
+from poker import PokerCard, PokerHand, score_table
+
+
+def make_hand(*cards: tuple[Suit, int]) -> PokerHand:
+    hand = PokerHand()
+    for suit, number in cards:
+        hand.append(PokerCard(suit, number))
+    return hand
+
+
+class TestExchange:
+    """カード交換のテスト
+    """
+    def test_keeps_made_hand(self):
+        """フルハウスは 1枚も捨てない
+        """
+        hand = make_hand((Suit.SPADE, 5), (Suit.HEART, 5), (Suit.CLUB, 5),
+                         (Suit.SPADE, 13), (Suit.HEART, 13))
+        decision = ExchangeEngine().best(hand)
+        assert decision.discard == ()
+        assert decision.exact
+        assert decision.expected == hand.score
+
+    def test_keeps_pair(self):
+        """ワンペアはペアを残して 3枚捨てる
+        """
+        hand = make_hand((Suit.SPADE, 9), (Suit.HEART, 2), (Suit.CLUB, 9),
+                         (Suit.SPADE, 4), (Suit.DIAMOND, 7))
+        assert ExchangeEngine().best(hand).discard == (1, 3, 4)
+
+    def test_sampled_subsets(self):
+        """samplesを指定すると、組み合わせが多いものは抽選で見積もる
+        """
+        hand = make_hand((Suit.SPADE, 1), (Suit.SPADE, 10), (Suit.SPADE, 11),
+                         (Suit.SPADE, 12), (Suit.HEART, 3))
+        decisions = ExchangeEngine(samples=100).evaluate(hand)
+        assert len({d.discard for d in decisions}) == 32
+        assert all(d.exact == (len(d.discard) <= 1) for d in decisions)
+
+    def test_exact_expectation(self):
+        """期待値がすべての組み合わせの評価値の平均と一致する
+        """
+        hand = make_hand((Suit.HEART, 1), (Suit.HEART, 10), (Suit.HEART, 12),
+                         (Suit.SPADE, 10), (Suit.CLUB, 4))
+        decisions = {d.discard: d
+                     for d in ExchangeEngine().evaluate(hand)}
+        ids = [c.id for c in hand.cards]
+        unseen = [i for i in range(52) if i not in ids]
+        lookup = score_table().lookup_ids
+        for discard in ((3, 4), (0, 3, 4), (1, 3)):
+            kept = [ids[i] for i in range(5) if i not in discard]
+            scores = [lookup(kept + list(c))
+                      for c in combinations(unseen, len(discard))]
+            assert decisions[discard].exact
+            assert decisions[discard].expected == \
+                pytest.approx(sum(scores) / len(scores))
+
+    def test_same_seed_same_result(self):
+        """seedが同じならプロセス数によらず同じ結果になる
+        """
+        deck = Deck(card_cls=PokerCard, joker=False)
+        deck.shuffle()
+        hands = [PokerHand() for _ in range(3)]
+        for hand in hands:
+            for card in deck.draw_many(5):
+                hand.append(card)
+        engine = ExchangeEngine(samples=100, seed=7)
+        a = engine.decide(hands, workers=1)
+        b = ExchangeEngine(samples=100, seed=7) \
+            .decide(hands, workers=2)
+        assert a == b
+
+    def test_play_draws_replacements(self):
+        """捨てた枚数だけデッキから引き直す
+        """
+        deck = Deck(card_cls=PokerCard, joker=False)
+        deck.shuffle()
+        hands = [PokerHand() for _ in range(4)]
+        for hand in hands:
+            for card in deck.draw_many(5):
+                hand.append(card)
+        decisions = ExchangeEngine().play(hands, deck)
+        assert deck.len == 52 - 20 - sum(len(d.discard) for d in decisions)
+        assert all(len(hand.cards) == 5 for hand in hands)
+
+    def test_invalid_hand(self):
+        """5枚でない手札は評価できない
+        """
+        with pytest.raises(ValueError):
+            ExchangeEngine().best(make_hand((Suit.SPADE, 1)))
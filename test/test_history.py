@@ -0,0 +1,88 @@
+import pytest
+
+from card import Deck
+from history import HistoryReader, HistoryWriter
+from poker import PokerCard, PokerHand
+
+
+class TestHistory:
+    """手札の記録のテスト
+    """
+    def setup_method(self):
+        """セットアップ
+
+            シャッフルしたデッキから 3人に配る
+        """
+        deck = Deck(card_cls=PokerCard, joker=False)
+        deck.shuffle()
+        self.hands = []
+        for i in range(3):
+            hand = PokerHand(str(i))
+            for card in deck.draw_many(5):
+                hand.append(card)
+            self.hands.append(hand)
+
+    def test_write_and_read(self, tmp_path):
+        """書き込んだレコードを読み出せる
+        """
+        path = str(tmp_path / "history.bin")
+        with HistoryWriter(path, buffer_records=2) as writer:
+            for r in range(10):
+                writer.write_showdown(r, self.hands)
+        with HistoryReader(path) as reader:
+            assert len(reader) == 30
+            records = list(reader)
+            assert reader[-1] == records[-1]
+        assert [r.round for r in records[:4]] == [0, 0, 0, 1]
+        for record, hand in zip(records, self.hands):
+            assert record.cards == tuple(c.id for c in hand.cards)
+            assert record.score == hand.score
+            assert record.to_hand().score == hand.score
+        assert sum(r.winner for r in records[:3]) >= 1
+
+    def test_rescore(self, tmp_path):
+        """評価し直した評価値が記録と一致する
+        """
+        path = str(tmp_path / "history.bin")
+        with HistoryWriter(path) as writer:
+            writer.write_showdown(0, self.hands)
+        with HistoryReader(path) as reader:
+            for record, score in reader.rescore():
+                assert record.score == score
+
+    def test_not_a_history(self, tmp_path):
+        """形式が違うファイルはエラー
+        """
+        path = tmp_path / "other.bin"
+        path.write_bytes(b"NOTAHISTORYFILE")
+        with pytest.raises(ValueError):
+            HistoryReader(str(path))
+
+    def test_short_file(self, tmp_path):
+        """ヘッダより短いファイルもエラー
+        """
+        path = tmp_path / "short.bin"
+        path.write_bytes(b"PK")
+        with pytest.raises(ValueError):
+            HistoryReader(str(path))
+
+    def test_close_while_iterating(self, tmp_path):
+        """読み出している途中でも閉じられる
+        """
+        path = str(tmp_path / "history.bin")
+        with HistoryWriter(path) as writer:
+            writer.write_showdown(0, self.hands)
+        reader = HistoryReader(path)
+        records = iter(reader)
+        next(records)
+        reader.close()
+
+    def test_close_twice(self, tmp_path):
+        """with文の中で closeしても、もう一度 closeできる
+        """
+        path = str(tmp_path / "history.bin")
+        with HistoryWriter(path) as writer:
+            writer.write_showdown(0, self.hands)
+            writer.close()
+        with HistoryReader(path) as reader:
+            assert len(reader) == 3
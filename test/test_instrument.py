@@ -0,0 +1,70 @@
+import pytest
+
+from card import Card, Suit
+from instrument import Profiler
+from poker import PokerCard, PokerHand
+
+
+def make_hand(*cards: tuple[Suit, int]) -> PokerHand:
+    hand = PokerHand()
+    for suit, number in cards:
+        hand.append(PokerCard(suit, number))
+    return hand
+
+
+class TestProfiler:
+    """評価の計測のテスト
+    """
+    def test_stages_and_categories(self):
+        """段階ごとの回数と役ごとの回数を集める
+        """
+        pair = make_hand((Suit.SPADE, 2), (Suit.HEART, 2), (Suit.CLUB, 5),
+                         (Suit.DIAMOND, 9), (Suit.SPADE, 11))
+        # 4枚の手札は表を引かずに判定器で評価する(5枚用の役にはならない)
+        four = make_hand((Suit.SPADE, 3), (Suit.HEART, 3), (Suit.CLUB, 3),
+                         (Suit.DIAMOND, 3))
+        PokerHand.score_cache.clear()
+        with Profiler() as profiler:
+            assert pair > four or pair < four
+            pair.evaluate()
+            PokerCard(Suit.SPADE, 1) > PokerCard(Suit.SPADE, 2)
+        snapshot = profiler.snapshot()
+        stages = snapshot["stages"]
+        assert stages["evaluate"]["calls"] == 2
+        assert stages["table_lookup"]["calls"] == 1
+        assert stages["chain"]["calls"] == 1
+        assert stages["pre_evaluate"]["calls"] == 1
+        assert stages["tester:Four of a kind"]["calls"] == 1
+        assert stages["calc_minor"]["calls"] == 1
+        assert stages["card_compare"]["calls"] == 1
+        assert stages["hand_compare"]["calls"] >= 1
+        assert all(s["seconds"] >= 0 for s in stages.values())
+        assert snapshot["categories"] == {"One pair": 1, "No pair": 1}
+
+    def test_disable_restores(self):
+        """無効にすると元のメソッドに戻り、計測しなくなる
+        """
+        evaluate = PokerHand.__dict__["_PokerHand__evaluate_uncached"]
+        lt = Card.__dict__["__lt__"]
+        testers = [e.tester for e in PokerHand._PokerHand__EVALUATORS]
+        profiler = Profiler()
+        profiler.enable()
+        assert profiler.enabled
+        assert Card.__dict__["__lt__"] is not lt
+        profiler.disable()
+        assert not profiler.enabled
+        assert PokerHand.__dict__["_PokerHand__evaluate_uncached"] \
+            is evaluate
+        assert Card.__dict__["__lt__"] is lt
+        assert [e.tester for e in PokerHand._PokerHand__EVALUATORS] \
+            == testers
+
+        make_hand((Suit.SPADE, 2), (Suit.HEART, 4)).evaluate()
+        assert profiler.snapshot() == {"stages": {}, "categories": {}}
+
+    def test_only_one_active(self):
+        """同時に有効にできる Profilerは 1つだけ
+        """
+        with Profiler():
+            with pytest.raises(RuntimeError):
+                Profiler().enable()
@@ -1,5 +1,13 @@
-from poker import PokerCard, PokerHand
-from card import Deck, Suit
+import itertools
+import pickle
+import random
+
+import pytest
+
+import poker
+from poker import (PokerCard, PokerHand, PokerHandEnum, ScoreCache,
+                   ScoreTable, ranking, score_table, showdown, split_pot)
+from card import BitHand, Card, Deck, Suit, spawn_rngs
 
 
 class TestDeck:
@@ -27,6 +35,159 @@ class TestDeck:
         deck = Deck(card_cls=PokerCard, joker=True)
         assert deck.len == 53
 
+    def test_deck_creation_with_two_jokers(self):
+        """ジョーカーを 2枚にするとカードは 54枚
+        """
+        deck = Deck(card_cls=PokerCard, joker=2)
+        assert deck.len == 54
+        jokers = [c for c in deck if c.suit == Suit.JOKER]
+        assert [c.id for c in jokers] == [52, 53]
+        assert all(c.strength == 0 for c in jokers)
+        with pytest.raises(ValueError):
+            Deck(joker=3)
+
+    def test_draw_many_and_reset(self):
+        """まとめて取り出したカードは 1枚ずつ取り出した順番と同じ
+        """
+        deck1 = Deck(card_cls=PokerCard, joker=False)
+        deck2 = Deck(card_cls=PokerCard, joker=False)
+        hand = deck1.draw_many(5)
+        assert [c.id for c in hand] == [deck2.draw().id for _ in range(5)]
+        assert deck1.len == 47
+        deck1.reset()
+        assert deck1.len == 52
+        assert list(deck1) == list(Deck(card_cls=PokerCard, joker=False))
+        with pytest.raises(IndexError):
+            deck1.draw_many(53)
+
+    def test_shuffle_with_own_rng(self):
+        """同じ seedの乱数生成器を渡したデッキは同じ順番になる
+        """
+        rng1, rng2 = spawn_rngs(42, 2)
+        deck1 = Deck(card_cls=PokerCard, joker=False, rng=rng1)
+        deck2 = Deck(card_cls=PokerCard, joker=False,
+                     rng=spawn_rngs(42, 1)[0])
+        deck1.shuffle()
+        deck2.shuffle()
+        assert [c.id for c in deck1] == [c.id for c in deck2]
+        deck3 = Deck(card_cls=PokerCard, joker=False, rng=rng2)
+        deck3.shuffle()
+        assert [c.id for c in deck1] != [c.id for c in deck3]
+
+    def test_partial_shuffle(self):
+        """部分的なシャッフルでもデッキのカードの構成は変わらない
+        """
+        deck = Deck(card_cls=PokerCard, joker=False)
+        random.seed(0)
+        deck.shuffle(5)
+        assert sorted(c.id for c in deck) == list(range(52))
+        drawn = deck.draw_many(5)
+        assert len({c.id for c in drawn}) == 5
+
+
+class TestCard:
+    """Cardクラスのテスト
+    """
+    def test_cards_are_interned(self):
+        """同じカードは同じインスタンスを共有する
+        """
+        card = PokerCard(Suit.SPADE, 1)
+        assert card is PokerCard(Suit.SPADE, 1)
+        assert card is PokerCard.from_id(card.id)
+        assert card is not Card(Suit.SPADE, 1)
+        assert pickle.loads(pickle.dumps(card)) is card
+
+    def test_card_encoding(self):
+        """通し番号とビットマスク、強さ
+        """
+        card = PokerCard(Suit.HEART, 1)
+        assert card.id == 2 * 13
+        assert card.mask == 1 << 26
+        assert card.rank_bit == 1
+        assert card.strength == 14
+        assert Card(Suit.HEART, 1).strength == 301
+        assert not hasattr(card, "__dict__")
+
+    def test_compare_with_other_class(self):
+        """異なるクラスのカードとは比較できない
+        """
+        with pytest.raises(TypeError):
+            PokerCard(Suit.HEART, 1) < Card(Suit.HEART, 2)
+
+    def test_cards_are_hashable(self):
+        """強さが同じカードは等しく、ハッシュ値も同じになる
+
+        比較演算(==, <=, >=)の結果はそろい、カードそのものは idで区別する
+        """
+        spade, heart = PokerCard(Suit.SPADE, 1), PokerCard(Suit.HEART, 1)
+        king = PokerCard(Suit.SPADE, 13)
+        assert spade == heart and spade <= heart and spade >= heart
+        assert hash(spade) == hash(heart)
+        assert {spade, heart} == {heart}
+        assert spade != king and spade > king
+        assert {spade: 1}[PokerCard.from_id(spade.id)] == 1
+        assert len({c.id for c in (spade, heart, king)}) == 3
+        with pytest.raises(TypeError):
+            spade == Card(Suit.SPADE, 1)
+
+    def test_remove_equal_card(self):
+        """強さが同じ別のカードを取り除いてもビットマスクは正しい
+        """
+        hand = PokerHand()
+        spade, heart = PokerCard(Suit.SPADE, 5), PokerCard(Suit.HEART, 5)
+        hand.append(spade)
+        assert hand.mask == spade.mask
+        hand.cards.remove(heart)
+        assert hand.cards == [] and hand.mask == 0
+
+
+class TestBitHand:
+    """BitHandクラスのテスト
+    """
+    def setup_method(self):
+        """セットアップ
+
+            フルハウスの手札を用意する
+        """
+        self.hand = BitHand()
+        for s, n in ((Suit.SPADE, 5), (Suit.HEART, 5), (Suit.CLUB, 5),
+                     (Suit.SPADE, 13), (Suit.HEART, 13)):
+            self.hand.append(Card(s, n))
+
+    def test_masks_follow_append(self):
+        """appendでビットマスクが更新される
+        """
+        assert self.hand.rank_mask == (1 << 4) | (1 << 12)
+        assert self.hand.kinds(3) == 1 << 4
+        assert self.hand.kinds(2) == (1 << 4) | (1 << 12)
+        assert self.hand.groups == [3, 2]
+        assert self.hand.suit_mask(Suit.SPADE) == (1 << 4) | (1 << 12)
+        assert self.hand.suits == {Suit.SPADE, Suit.HEART, Suit.CLUB}
+
+    def test_masks_rebuilt_after_direct_edit(self):
+        """cardsを直接編集してもビットマスクが作り直される
+        """
+        del self.hand.cards[2]
+        assert self.hand.groups == [2, 2]
+        assert self.hand.suits == {Suit.SPADE, Suit.HEART}
+        self.hand.append(Card(Suit.DIAMOND, 1))
+        assert self.hand.groups == [2, 2, 1]
+        assert self.hand.suit_mask(Suit.DIAMOND) == 1
+
+    def test_canonical_key(self):
+        """スートを入れ替えた手札は同じキーになる
+        """
+        swapped = {Suit.SPADE: Suit.DIAMOND, Suit.HEART: Suit.SPADE,
+                   Suit.CLUB: Suit.HEART}
+        other = BitHand()
+        for card in self.hand.cards:
+            other.append(Card(swapped[card.suit], card.number))
+        assert other.canonical_key == self.hand.canonical_key
+        assert self.hand.canonical_key == \
+            (0, (1 << 4) | (1 << 12), (1 << 4) | (1 << 12), 1 << 4, 0)
+        other.append(Card(Suit.JOKER, 0))
+        assert other.canonical_key != self.hand.canonical_key
+
 
 class TestPokerScenario:
     """役判定のテスト
@@ -83,3 +244,401 @@ class TestPokerScenario:
         self.hand1.append(PokerCard(Suit.SPADE, 13))
         self.hand1.append(PokerCard(Suit.SPADE, 12))
         assert self.hand1.evaluate() == "Flush"
+
+    def test_eval_hand5(self):
+        """ストレートのテスト
+        """
+        self.hand1.append(PokerCard(Suit.SPADE, 9))
+        self.hand1.append(PokerCard(Suit.HEART, 10))
+        self.hand1.append(PokerCard(Suit.SPADE, 11))
+        self.hand1.append(PokerCard(Suit.CLUB, 13))
+        self.hand1.append(PokerCard(Suit.SPADE, 12))
+        assert self.hand1.evaluate() == "Straight"
+        assert self.hand1.major == PokerHandEnum.STRAIGHT
+        assert self.hand1.minor == 1312111009
+
+    def test_eval_wheel(self):
+        """A-2-3-4-5のストレートは 5が最も強いカードになる
+        """
+        for s, n in ((Suit.SPADE, 1), (Suit.HEART, 2), (Suit.SPADE, 3),
+                     (Suit.CLUB, 4), (Suit.SPADE, 5)):
+            self.hand1.append(PokerCard(s, n))
+        for s, n in ((Suit.SPADE, 2), (Suit.HEART, 3), (Suit.SPADE, 4),
+                     (Suit.CLUB, 5), (Suit.SPADE, 6)):
+            self.hand2.append(PokerCard(s, n))
+        assert self.hand1.evaluate() == "Straight"
+        assert self.hand1.minor == 504030201
+        assert self.hand1 < self.hand2
+
+    def test_eval_steel_wheel(self):
+        """A-2-3-4-5のストレートフラッシュはロイヤルではない
+        """
+        for n in (1, 2, 3, 4, 5):
+            self.hand1.append(PokerCard(Suit.HEART, n))
+        for n in (2, 3, 4, 5, 6):
+            self.hand2.append(PokerCard(Suit.CLUB, n))
+        assert self.hand1.evaluate() == "Straight flush"
+        assert self.hand1.minor == 504030201
+        assert self.hand1 < self.hand2
+
+
+class TestScoreTable:
+    """評価値の表のテスト
+    """
+    def test_table_matches_evaluators(self):
+        """表引きの結果が判定器の結果と一致する
+        """
+        for seed in range(200):
+            deck = Deck(card_cls=PokerCard, joker=False)
+            random.seed(seed)
+            deck.shuffle()
+            hand = PokerHand()
+            for _ in range(5):
+                hand.append(deck.draw())
+            name = hand.evaluate()
+            expected = hand._PokerHand__evaluate_by_chain()
+            assert (hand.major, hand.minor, name) == expected
+
+    def test_save_and_load(self, tmp_path):
+        """書き出した表を読み込むと同じ評価値を引ける
+        """
+        path = str(tmp_path / "table.bin")
+        score_table().save(path)
+        loaded = ScoreTable.load(path)
+        assert list(loaded.flush) == list(score_table().flush)
+        assert list(loaded.unsuited) == list(score_table().unsuited)
+
+    def test_load_rejects_bad_files(self, tmp_path, monkeypatch):
+        """壊れたファイル・古いバージョンのファイルは読み込まない
+        """
+        path = tmp_path / "table.bin"
+        score_table().save(str(path))
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        broken = tmp_path / "broken.bin"
+        broken.write_bytes(bytes(data))
+        with pytest.raises(ValueError):
+            ScoreTable.load(str(broken))
+        monkeypatch.setattr(ScoreTable, "VERSION", ScoreTable.VERSION + 1)
+        with pytest.raises(ValueError):
+            ScoreTable.load(str(path))
+
+    def test_cache_path(self, monkeypatch, tmp_path):
+        """表のファイルはユーザーのキャッシュディレクトリに置く
+        """
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        assert poker.cache_path("score_table.bin") == \
+            str(tmp_path / "card_game" / "score_table.bin")
+
+    def test_unwritable_path(self, monkeypatch, tmp_path):
+        """表を書き出せなくてもメモリ上の表を使える
+        """
+        expected = list(score_table().unsuited)
+        blocker = tmp_path / "file"
+        blocker.write_bytes(b"")
+        monkeypatch.setattr(poker, "SCORE_TABLE_PATH",
+                            str(blocker / "table.bin"))
+        monkeypatch.setattr(poker, "_score_table", None)
+        assert list(score_table().unsuited) == expected
+        assert not (blocker / "table.bin").exists()
+
+    def test_fallback_for_four_cards(self):
+        """5枚でない手札は判定器で評価する
+        """
+        hand = PokerHand()
+        for n in (2, 5, 7, 9):
+            hand.append(PokerCard(Suit.HEART if n == 2 else Suit.CLUB, n))
+        assert score_table().lookup(hand.cards) == 0
+        assert hand.evaluate() == "No pair"
+
+
+class TestEvaluateBest:
+    """6枚以上の手札から最も強い 5枚を選ぶテスト
+    """
+    def make_hand(self, cards):
+        hand = PokerHand()
+        for s, n in cards:
+            hand.append(PokerCard(s, n))
+        return hand
+
+    def test_best_of_seven(self):
+        """7枚からストレートフラッシュを選ぶ
+        """
+        hand = self.make_hand([(Suit.CLUB, 2), (Suit.CLUB, 3),
+                               (Suit.HEART, 1), (Suit.CLUB, 4),
+                               (Suit.CLUB, 5), (Suit.SPADE, 9),
+                               (Suit.CLUB, 6)])
+        name, best = hand.evaluate_best()
+        assert name == "Straight flush"
+        assert sorted(c.number for c in best) == [2, 3, 4, 5, 6]
+        assert all(c.suit == Suit.CLUB for c in best)
+
+    def test_matches_all_subhands(self):
+        """21通りの 5枚の手札を評価した最大値と一致する
+        """
+        rng = random.Random(3)
+        for _ in range(50):
+            ids = rng.sample(range(52), 7)
+            hand = PokerHand()
+            for i in ids:
+                hand.append(PokerCard.from_id(i))
+            hand.evaluate_best()
+            scores = []
+            for combo in itertools.combinations(hand.cards, 5):
+                sub = self.make_hand((c.suit, c.number) for c in combo)
+                sub.evaluate()
+                scores.append((sub.major, sub.minor))
+            assert (hand.major, hand.minor) == max(scores)
+
+    def test_compare_seven_card_hands(self):
+        """7枚の手札同士を比較できる
+        """
+        board = [(Suit.SPADE, 2), (Suit.HEART, 7), (Suit.CLUB, 9),
+                 (Suit.DIAMOND, 12), (Suit.SPADE, 13)]
+        pair = self.make_hand(board + [(Suit.HEART, 13), (Suit.CLUB, 3)])
+        high = self.make_hand(board + [(Suit.HEART, 1), (Suit.CLUB, 4)])
+        assert pair > high
+        assert pair.evaluate() == "One pair"
+
+
+class TestJoker:
+    """ジョーカーを含む手札のテスト
+    """
+    def make_hand(self, cards, jokers=1):
+        hand = PokerHand()
+        for s, n in cards:
+            hand.append(PokerCard(s, n))
+        for n in range(jokers):
+            hand.append(PokerCard(Suit.JOKER, n))
+        return hand
+
+    def test_five_of_a_kind(self):
+        """4枚同じ番号とジョーカーはファイブカードで、最も強い
+        """
+        five = self.make_hand([(s, 1) for s in (Suit.SPADE, Suit.HEART,
+                                                Suit.CLUB, Suit.DIAMOND)])
+        royal = self.make_hand([(Suit.SPADE, n) for n in (1, 10, 11, 12, 13)],
+                               jokers=0)
+        assert five.evaluate() == "Five of a kind"
+        assert five.major == PokerHandEnum.FIVE_OF_A_KIND
+        assert five > royal
+
+    def test_best_substitution(self):
+        """ジョーカーは最も強くなるカードの代わりになる
+        """
+        cases = [
+            ([(Suit.SPADE, 10), (Suit.SPADE, 11), (Suit.SPADE, 12),
+              (Suit.SPADE, 13)], 1, "Royal straight flush"),
+            ([(Suit.HEART, 2), (Suit.CLUB, 2), (Suit.SPADE, 9),
+              (Suit.DIAMOND, 13)], 1, "Three of a kind"),
+            ([(Suit.HEART, 3), (Suit.HEART, 4), (Suit.HEART, 6)], 2,
+             "Straight flush"),
+            ([(Suit.HEART, 3), (Suit.CLUB, 3), (Suit.SPADE, 8)], 2,
+             "Four of a kind"),
+            ([(Suit.CLUB, 2), (Suit.CLUB, 5), (Suit.CLUB, 9),
+              (Suit.CLUB, 13)], 1, "Flush"),
+        ]
+        for cards, jokers, name in cases:
+            assert self.make_hand(cards, jokers).evaluate() == name
+
+    def test_wheel_with_joker(self):
+        """A-2-3-4とジョーカーは 5が最も強いストレート
+        """
+        hand = self.make_hand([(Suit.HEART, 1), (Suit.CLUB, 2),
+                               (Suit.SPADE, 3), (Suit.HEART, 4)])
+        assert hand.evaluate() == "Straight"
+        assert hand.minor == 504030201
+
+    def test_best_of_seven_with_joker(self):
+        """7枚からジョーカーを使った 5枚を選ぶ
+        """
+        hand = self.make_hand([(Suit.SPADE, 9), (Suit.HEART, 9),
+                               (Suit.CLUB, 9), (Suit.SPADE, 4),
+                               (Suit.HEART, 4), (Suit.CLUB, 12)])
+        name, best = hand.evaluate_best()
+        assert name == "Four of a kind"
+        assert any(c.suit == Suit.JOKER for c in best)
+        assert hand.suits == {Suit.SPADE, Suit.HEART, Suit.CLUB}
+
+
+class TestScoreCache:
+    """評価結果のキャッシュのテスト
+    """
+    def setup_method(self):
+        """セットアップ
+
+            ワンペアの手札を用意してキャッシュの統計を戻す
+        """
+        self.hand = PokerHand()
+        for s, n in ((Suit.SPADE, 5), (Suit.HEART, 5), (Suit.CLUB, 1),
+                     (Suit.SPADE, 13), (Suit.SPADE, 12)):
+            self.hand.append(PokerCard(s, n))
+        PokerHand.cache_stats.reset()
+
+    def test_repeated_evaluation_hits_cache(self):
+        """2回目以降の評価はキャッシュから返す
+        """
+        assert self.hand.evaluate() == "One pair"
+        assert self.hand.evaluate() == "One pair"
+        assert PokerHand.cache_stats.hits == 1
+        assert PokerHand.cache_stats.misses == 1
+
+    def test_direct_edit_invalidates_cache(self):
+        """cardsを直接編集するとキャッシュが捨てられる
+        """
+        assert self.hand.evaluate() == "One pair"
+        del self.hand.cards[0]
+        self.hand.append(PokerCard(Suit.DIAMOND, 1))
+        assert self.hand.evaluate() == "One pair"
+        assert self.hand.minor == 14131205
+        assert PokerHand.cache_stats.misses == 2
+
+    def test_hands_are_hashable(self):
+        """同点でもカードが違う手札は集合や辞書で区別できる
+        """
+        other = PokerHand()
+        for s, n in ((Suit.DIAMOND, 5), (Suit.CLUB, 5), (Suit.HEART, 1),
+                     (Suit.CLUB, 13), (Suit.CLUB, 12)):
+            other.append(PokerCard(s, n))
+        assert other == self.hand
+        assert len({self.hand, other}) == 2
+        assert {self.hand: 1}[self.hand] == 1
+
+    def test_compare_hand_with_other_type(self):
+        """手札以外と == で比べると Falseになり、例外を上げない
+        """
+        assert self.hand != self.hand.score
+        assert self.hand not in [None, 0]
+        assert self.hand not in {self.hand.score: 1}
+        with pytest.raises(TypeError):
+            self.hand < 0
+
+    def test_score_cache_shares_isomorphic_hands(self):
+        """スートを入れ替えた 4枚の手札は評価値のキャッシュを共有する
+        """
+        PokerHand.score_cache.clear()
+        for suits in ((Suit.SPADE, Suit.HEART), (Suit.CLUB, Suit.DIAMOND)):
+            hand = PokerHand()
+            for s, n in zip(suits * 2, (9, 9, 4, 2)):
+                hand.append(PokerCard(s, n))
+            assert hand.evaluate() == "No pair"
+        assert PokerHand.score_cache.misses == 1
+        assert PokerHand.score_cache.hits == 1
+
+    def test_score_cache_evicts_oldest(self):
+        """maxsizeを超えたら最も長く使われていない項目を捨てる
+        """
+        cache = ScoreCache(maxsize=2)
+        cache.put((1,), 10)
+        cache.put((2,), 20)
+        assert cache.get((1,)) == 10
+        cache.put((3,), 30)
+        assert cache.get((2,)) is None
+        assert cache.get((1,)) == 10
+        assert (len(cache), cache.evictions) == (2, 1)
+        assert (cache.hits, cache.misses) == (2, 1)
+
+
+class TestIncremental:
+    """1枚ずつの追加・削除と、評価しない役の判定のテスト
+    """
+    def test_category_while_dealing(self):
+        """配っている途中の手札の役
+        """
+        hand = PokerHand()
+        expected = [PokerHandEnum.NO_PAIR, PokerHandEnum.ONE_PAIR,
+                    PokerHandEnum.THREE_OF_A_KIND,
+                    PokerHandEnum.FOUR_OF_A_KIND,
+                    PokerHandEnum.FOUR_OF_A_KIND]
+        cards = [PokerCard(s, 7) for s in (Suit.CLUB, Suit.DIAMOND,
+                                           Suit.HEART, Suit.SPADE)]
+        for card, category in zip(cards + [PokerCard(Suit.CLUB, 13)],
+                                  expected):
+            hand.append(card)
+            assert hand.category == category
+        hand.cards.remove(PokerCard(Suit.HEART, 7))
+        assert hand.category == PokerHandEnum.THREE_OF_A_KIND
+        del hand.cards[0]
+        assert hand.category == PokerHandEnum.ONE_PAIR
+
+    def test_removal_updates_masks(self):
+        """反映済みの手札からの 1枚の削除はビットマスクを作り直さずに更新する
+        """
+        rng = random.Random(5)
+        for _ in range(200):
+            hand = PokerHand()
+            for i in rng.sample(range(54), 7):
+                hand.append(PokerCard.from_id(i))
+            # ビットマスクは最初に参照したときに作る
+            assert hand._BitHand__synced == -1
+            assert hand.mask
+            hand.cards.remove(rng.choice(hand.cards))
+            hand.cards.pop(rng.randrange(6))
+            del hand.cards[0]
+            assert hand._BitHand__synced == 4
+            rebuilt = PokerHand()
+            for card in hand.cards:
+                rebuilt.append(card)
+            assert (hand.mask, hand.groups, hand.jokers, hand.category) \
+                == (rebuilt.mask, rebuilt.groups, rebuilt.jokers,
+                    rebuilt.category)
+
+    def test_category_matches_evaluate(self):
+        """5枚以上の手札では evaluateの役と一致する
+        """
+        rng = random.Random(11)
+        for size in (5, 6, 7):
+            for jokers in (0, 1, 2):
+                for _ in range(300):
+                    hand = PokerHand()
+                    ids = rng.sample(range(52), size - jokers)
+                    for i in ids + [52, 53][:jokers]:
+                        hand.append(PokerCard.from_id(i))
+                    hand.evaluate()
+                    assert hand.category == hand.major
+
+
+class TestShowdown:
+    """勝者の判定のテスト
+    """
+    def setup_method(self):
+        """セットアップ
+
+            ワンペアが 2人(同じ強さ)、ノーペアが 1人
+        """
+        hands = [
+            [(Suit.SPADE, 5), (Suit.HEART, 5), (Suit.CLUB, 1),
+             (Suit.SPADE, 13), (Suit.SPADE, 12)],
+            [(Suit.SPADE, 2), (Suit.HEART, 4), (Suit.CLUB, 6),
+             (Suit.SPADE, 8), (Suit.SPADE, 10)],
+            [(Suit.DIAMOND, 5), (Suit.CLUB, 5), (Suit.HEART, 1),
+             (Suit.HEART, 13), (Suit.DIAMOND, 12)],
+        ]
+        self.players = []
+        for i, cards in enumerate(hands):
+            hand = PokerHand(str(i + 1))
+            for s, n in cards:
+                hand.append(PokerCard(s, n))
+            self.players.append(hand)
+        PokerHand.cache_stats.reset()
+
+    def test_showdown_ties(self):
+        """同じ強さの手札は全員勝者になり、各手札は 1回だけ評価する
+        """
+        winners = showdown(self.players)
+        assert [w.name for w in winners] == ["1", "3"]
+        assert PokerHand.cache_stats.misses == 3
+
+    def test_split_pot(self):
+        """端数は席順で前の勝者に配る
+        """
+        assert split_pot(101, self.players) == [51, 0, 50]
+        with pytest.raises(ValueError):
+            split_pot(100, [])
+
+    def test_ranking(self):
+        """強い順に同じ強さの手札をまとめて並べる
+        """
+        result = ranking(self.players)
+        assert [[h.name for h in group] for group in result] == \
+            [["1", "3"], ["2"]]
@@ -0,0 +1,94 @@
+import pytest
+
+from equity import Equity
+from ranges import (HAND_CLASSES, MatchupCache, RangeEquity, combos,
+                    parse_range)
+
+
+class TestClasses:
+    """クラスとレンジの書き方のテスト
+    """
+    def test_classes_cover_all_combos(self):
+        """169通りのクラスで 2枚の組み合わせ 1326通りをちょうど覆う
+        """
+        assert len(HAND_CLASSES) == 169
+        all_combos = [frozenset(c) for n in HAND_CLASSES for c in combos(n)]
+        assert len(all_combos) == len(set(all_combos)) == 1326
+        assert len(combos("AA")) == 6
+        assert len(combos("AKs")) == 4
+        assert len(combos("AKo")) == 12
+
+    def test_parse_range(self):
+        """+ と重みを展開する
+        """
+        assert parse_range("QQ+, ATs+ 72o:0.5") == {
+            "QQ": 1.0, "KK": 1.0, "AA": 1.0,
+            "ATs": 1.0, "AJs": 1.0, "AQs": 1.0, "AKs": 1.0, "72o": 0.5}
+        with pytest.raises(ValueError):
+            parse_range("AKx")
+        with pytest.raises(ValueError):
+            parse_range("AA:-1")
+
+
+class TestRangeEquity:
+    """レンジ同士の勝率のテスト
+    """
+    def test_matrix(self, tmp_path):
+        """表の形と重み、保存した結果を使った 2回目が同じになること
+        """
+        path = str(tmp_path / "cache.sqlite3")
+        with MatchupCache(path) as cache:
+            result = RangeEquity(trials=300, cache=cache).matrix(
+                "AA, AKs", {"KK": 1.0, "72o": 2.0})
+            stored = len(cache)
+        # AAと KKのスートの組み合わせ 36通りは 3通りにまとまる
+        # (共通のスートが 0, 1, 2種類)、AKsと KKは 1通り
+        assert stored < 4 * 36
+        assert result.rows == ["AA", "AKs"]
+        assert result.cols == ["KK", "72o"]
+        # AKsと KKは Kが重ならない 4 * 3通り
+        assert result.weights[1][0] == 12
+        assert result.weights[0][1] == 2.0 * 6 * 12
+        assert result.equity[0][0] > 0.6
+        assert 0 < result.total < 1
+
+        with MatchupCache(path) as cache:
+            assert len(cache) == stored
+            again = RangeEquity(trials=300, cache=cache).matrix(
+                "AA, AKs", {"KK": 1.0, "72o": 2.0}, workers=2)
+        assert again == result
+
+    def test_cache_eviction(self):
+        """件数が maxsizeを超えたら最後に使われたのが古いものから消す
+        """
+        with MatchupCache(":memory:", maxsize=2) as cache:
+            cache.put_many({"a": Equity(1, 0, 0, 1)})
+            cache.put_many({"b": Equity(0, 1, 0, 1)})
+            cache.get_many(["a"])
+            cache.put_many({"c": Equity(0, 0, 1, 1)})
+            assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+    def test_default_cache_is_persistent(self, tmp_path, monkeypatch):
+        """cacheを渡さなければ RANGE_CACHE_PATHのファイルに保存する
+        """
+        import ranges
+        path = str(tmp_path / "default.sqlite3")
+        monkeypatch.setattr(ranges, "RANGE_CACHE_PATH", path)
+        equity = RangeEquity(trials=100)
+        equity.matchup("AA", "KK")
+        equity.cache.close()
+        with MatchupCache(path) as cache:
+            assert len(cache) == 3
+
+    def test_default_cache_unwritable(self, tmp_path, monkeypatch):
+        """RANGE_CACHE_PATHに書き込めなければメモリ上に置く
+        """
+        import ranges
+        blocker = tmp_path / "file"
+        blocker.write_bytes(b"")
+        monkeypatch.setattr(ranges, "RANGE_CACHE_PATH",
+                            str(blocker / "cache.sqlite3"))
+        with MatchupCache() as cache:
+            assert cache.path == ":memory:"
+            cache.put_many({"a": Equity(1, 0, 0, 1)})
+            assert len(cache) == 1
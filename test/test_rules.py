@@ -0,0 +1,137 @@
+import random
+
+import pytest
+
+from card import Card, Suit
+from poker import PokerCard, PokerHand
+from rules import available_games, get_rules, register, GameRules
+
+
+def ids(*cards: tuple[Suit, int]) -> list[int]:
+    return [Card.card_id(suit, number) for suit, number in cards]
+
+
+class TestRegistry:
+    """ルールの登録のテスト
+    """
+    def test_games(self):
+        """4つのゲームが登録されていて、名前で引ける
+        """
+        assert available_games() == ["poker", "blackjack", "hearts",
+                                     "daifugo"]
+        with pytest.raises(ValueError):
+            get_rules("bridge")
+        with pytest.raises(ValueError):
+            @register
+            class Duplicate(GameRules):
+                name = "poker"
+        with pytest.raises(TypeError):
+            @register
+            class Incomplete(GameRules):
+                name = "incomplete"
+        assert "incomplete" not in available_games()
+
+    def test_deal(self):
+        """共通のデッキから配る(大富豪はジョーカーを含めて配り切る)
+        """
+        rules = get_rules("daifugo")
+        deck = rules.new_deck(random.Random(1))
+        deck.shuffle()
+        hands = rules.deal(deck, 4)
+        assert [len(h) for h in hands] == [14, 13, 13, 13]
+        assert sorted(i for h in hands for i in h) == list(range(53))
+        assert deck.len == 0
+
+
+class TestScores:
+    """ゲームごとの評価のテスト
+    """
+    def test_poker(self):
+        """ポーカーは PokerHand.scoreと同じ
+        """
+        cards = ids((Suit.SPADE, 1), (Suit.HEART, 1), (Suit.CLUB, 9),
+                    (Suit.DIAMOND, 9), (Suit.SPADE, 4))
+        hand = PokerHand()
+        for i in cards:
+            hand.append(PokerCard.from_id(i))
+        assert get_rules("poker").score(cards) == hand.score
+
+    def test_poker_card_count(self):
+        """6枚以上は最も強い 5枚で評価し、5枚未満はエラー
+        """
+        rules = get_rules("poker")
+        hand = PokerHand()
+        for i in range(7):
+            hand.append(PokerCard.from_id(i))
+        assert rules.score(list(range(7))) == hand.score
+        assert rules.score(list(range(7))) > rules.score(list(range(5)))
+        with pytest.raises(ValueError):
+            rules.score([0, 1, 2, 3])
+
+    def test_blackjack(self):
+        """Aは 1か 11、21を超えたら 0、最初の 2枚で 21なら 22
+        """
+        rules = get_rules("blackjack")
+        assert rules.score(ids((Suit.SPADE, 1), (Suit.HEART, 13))) == 22
+        assert rules.score(ids((Suit.SPADE, 1), (Suit.HEART, 1),
+                               (Suit.CLUB, 9))) == 21
+        assert rules.score(ids((Suit.SPADE, 10), (Suit.HEART, 5),
+                               (Suit.CLUB, 9))) == 0
+
+    def test_hearts(self):
+        """失点が少ないほど良く、トリックは最初のスートの最強のカードが取る
+        """
+        rules = get_rules("hearts")
+        taken = ids((Suit.HEART, 2), (Suit.HEART, 1), (Suit.SPADE, 12),
+                    (Suit.CLUB, 12))
+        assert rules.score(taken) == 15
+        assert rules.winners([15, 0, 3, 0]) == [1, 3]
+        trick = ids((Suit.CLUB, 3), (Suit.CLUB, 1), (Suit.HEART, 13),
+                    (Suit.CLUB, 10))
+        assert rules.trick_winner(trick) == 1
+
+    def test_daifugo(self):
+        """2が最強でジョーカーはどの番号の代わりにもなる
+        """
+        rules = get_rules("daifugo")
+        twos = ids((Suit.SPADE, 2), (Suit.HEART, 2))
+        aces = ids((Suit.SPADE, 1), (Suit.HEART, 1))
+        assert rules.beats(twos, aces)
+        assert not rules.beats(aces, twos)
+        assert rules.score([aces[0], 52]) == rules.score(aces)
+        assert rules.score(ids((Suit.SPADE, 1), (Suit.HEART, 2))) == 0
+        assert not rules.beats(twos[:1], aces)
+
+    @pytest.mark.parametrize("name", ["poker", "blackjack", "hearts",
+                                      "daifugo"])
+    def test_score_batch(self, name):
+        """まとめて評価した結果が 1つずつ評価した結果と一致する
+        """
+        pytest.importorskip("numpy")
+        rules = get_rules(name)
+        hands = rules.deal_batch(200, 4, rng=1)
+        if name == "daifugo":
+            # 出すカードとして 2枚ずつに区切る
+            hands = hands[:, :, :12]
+        rows = hands.reshape(-1, 2 if name == "daifugo" else
+                             hands.shape[-1])
+        batch = rules.score_batch(rows)
+        assert list(batch) == [rules.score(list(r)) for r in rows]
+
+    def test_poker_score_batch_other_shapes(self):
+        """7枚の手札やジョーカー入りの手札もまとめて評価できる
+        """
+        np = pytest.importorskip("numpy")
+        rules = get_rules("poker")
+        rng = np.random.default_rng(2)
+        seven = np.array([rng.permutation(52)[:7] for _ in range(50)])
+        batch = rules.score_batch(seven)
+        assert list(batch) == [rules.score(list(r)) for r in seven]
+        wild = np.array([rng.permutation(54)[:5] for _ in range(200)])
+        assert (wild >= 52).any()
+        batch = rules.score_batch(wild)
+        assert list(batch) == [rules.score(list(r)) for r in wild]
+        with pytest.raises(ValueError):
+            rules.score_batch(seven[:, :4])
+        with pytest.raises(ValueError):
+            rules.score_batch(seven[0])
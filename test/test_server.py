@@ -0,0 +1,103 @@
+import asyncio
+from concurrent.futures import BrokenExecutor, Executor, ThreadPoolExecutor
+import threading
+
+from server import TableServer, load_test
+
+
+class TestServer:
+    """テーブルサーバーのテスト
+    """
+    def test_load_test(self):
+        """多数のクライアントが同時にプレイでき、操作ごとの時間が記録される
+        """
+        async def scenario():
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                server = TableServer(executor=executor, seed=1)
+                host, port = await server.start()
+                try:
+                    result = await load_test(host, port, clients=8,
+                                             rounds=3, seats=4)
+                finally:
+                    await server.close()
+            return server, result
+
+        server, result = asyncio.run(scenario())
+        assert result["rounds_per_second"] > 0
+        for action in ("deal", "exchange", "showdown"):
+            assert result["latency"][action]["count"] == 24
+            assert server.latency[action].count == 24
+        assert server.stats()["tables"] == 8
+
+    def test_commands(self):
+        """1人分の交換と勝負、エラーの応答
+        """
+        async def scenario():
+            server = TableServer(seed=2)
+            table = server.new_table(3)
+            assert not (await server.execute(f"SHOWDOWN {table}"))["ok"]
+            dealt = await server.execute(f"DEAL {table}")
+            exchanged = await server.execute(f"EXCHANGE {table} 1 0,4")
+            again = await server.execute(f"EXCHANGE {table} 1 2")
+            auto = await server.execute(f"EXCHANGE {table}")
+            result = await server.execute(f"SHOWDOWN {table}")
+            unknown = await server.execute("FOLD 0")
+            await server.close()
+            return dealt, exchanged, again, auto, result, unknown
+
+        dealt, exchanged, again, auto, result, unknown = \
+            asyncio.run(scenario())
+        assert len(dealt["hands"]) == 3
+        # 残したカードが前に詰められ、引いたカードが後ろに付く
+        assert exchanged["hands"][1][:3] == dealt["hands"][1][1:4]
+        assert exchanged["discards"] == {"1": [0, 4]}
+        assert not again["ok"]
+        assert set(auto["discards"]) == {"0", "2"}
+        assert result["ok"] and len(result["categories"]) == 3
+        assert result["winners"]
+        assert not unknown["ok"]
+
+    def test_close_fails_pending(self):
+        """closeすると評価を待っている操作はエラーの応答で終わる
+        """
+        async def scenario(executor, gate):
+            # 最初の評価はエグゼキュータが空くのを待ち続ける
+            executor.submit(gate.wait)
+            server = TableServer(executor=executor, batch_size=1,
+                                 concurrency=1, seed=3)
+            tables = [server.new_table(2) for _ in range(3)]
+            for table in tables:
+                await server.execute(f"DEAL {table}")
+            tasks = [asyncio.create_task(server.execute(f"SHOWDOWN {t}"))
+                     for t in tables]
+            await asyncio.sleep(0.05)
+            await server.close()
+            return await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+        gate = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            try:
+                results = asyncio.run(scenario(executor, gate))
+            finally:
+                gate.set()
+        assert [r["ok"] for r in results] == [False] * 3
+        assert all("closing" in r["error"] for r in results)
+
+    def test_executor_error(self):
+        """エグゼキュータが壊れていてもエラーの応答を返す
+        """
+        class Broken(Executor):
+            def submit(self, fn, *args, **kwargs):
+                raise BrokenExecutor("pool is broken")
+
+        async def scenario():
+            server = TableServer(executor=Broken(), seed=4)
+            table = server.new_table(2)
+            await server.execute(f"DEAL {table}")
+            result = await server.execute(f"SHOWDOWN {table}")
+            await server.close()
+            return result
+
+        result = asyncio.run(scenario())
+        assert not result["ok"]
+        assert "BrokenExecutor" in result["error"]
@@ -0,0 +1,45 @@
+import pytest
+
+from tournament import Table, iter_rounds, run
+
+
+class TestTournament:
+    """複数テーブルのテスト
+    """
+    def test_results_are_streamed(self):
+        """全テーブル・全ラウンドの結果がコールバックに渡される
+        """
+        results = []
+        stats = run(5, 3, seats=4, seed=1, workers=1, batch_size=2,
+                    callback=results.append)
+        assert stats.rounds == 15
+        assert stats.hands == 60
+        assert [(r.table, r.round) for r in results] == \
+            [(t, r) for t in range(5) for r in range(3)]
+        assert all(len(r.categories) == 4 for r in results)
+        assert all(r.draw == (len(r.winners) > 1) for r in results)
+
+    def test_same_seed_same_result(self):
+        """seedが同じならプロセス数やまとめ方によらず同じ結果になる
+        """
+        a = list(iter_rounds(6, 2, seed=3, workers=1, batch_size=4))
+        b = list(iter_rounds(6, 2, seed=3, workers=2, batch_size=1))
+        assert a == b
+
+    def test_table_reuses_objects(self):
+        """ラウンドが変わってもデッキと手札は同じオブジェクトを使う
+        """
+        table = Table(0, seats=3)
+        deck, players = table.deck, list(table.players)
+        table.play_round(0)
+        table.play_round(1)
+        assert table.deck is deck
+        assert all(a is b for a, b in zip(table.players, players))
+        assert all(len(p.cards) == 5 for p in table.players)
+        assert deck.len == 52 - 15
+
+    def test_invalid_seats(self):
+        """席数は 2 ~ 10
+        """
+        with pytest.raises(ValueError):
+            Table(0, seats=11)